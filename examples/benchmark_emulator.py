@@ -0,0 +1,76 @@
+"""Benchmark request latency and realtime throughput against a local emulated device"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from ttls.client import Twinkly
+from ttls.emulator import TwinklyEmulator, TwinklyEmulatorFaults
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def benchmark_requests(t: Twinkly, count: int, concurrency: int) -> None:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await t.set_brightness(i % 100)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"requests   {count / elapsed:10.1f} req/s"
+        f"  mean {statistics.mean(latencies) * 1000:7.1f} ms"
+        f"  p50 {percentile(latencies, 0.5) * 1000:7.1f} ms"
+        f"  p99 {percentile(latencies, 0.99) * 1000:7.1f} ms"
+        f"  max {max(latencies) * 1000:7.1f} ms"
+    )
+
+
+async def benchmark_realtime(t: Twinkly, emulator: TwinklyEmulator, version: int, count: int) -> None:
+    frame = bytes(t.length * t.bytes_per_led)
+    async with t.realtime(version=version) as rt:
+        start = time.perf_counter()
+        for i in range(count):
+            rt.send(frame)
+            if i % 100 == 0:
+                await rt.drain()
+        await rt.drain()
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.1)
+    print(f"realtime v{version} {count / elapsed:10.1f} frames/s  received {emulator.frames[version]}/{count}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api-version", metavar="version", type=int, choices=(1, 2), default=2, help="API version")
+    parser.add_argument("--leds", metavar="n", type=int, default=600, help="Number of LEDs")
+    parser.add_argument("--count", metavar="n", type=int, default=500, help="Number of requests and frames")
+    parser.add_argument("--concurrency", metavar="n", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--latency", metavar="seconds", type=float, default=0.005, help="Request latency")
+    parser.add_argument("--jitter", metavar="seconds", type=float, default=0.005, help="Random extra latency")
+    parser.add_argument("--disconnect-rate", metavar="rate", type=float, default=0, help="Share of dropped requests")
+    args = parser.parse_args()
+
+    faults = TwinklyEmulatorFaults(latency=args.latency, jitter=args.jitter, disconnect_rate=args.disconnect_rate)
+    async with TwinklyEmulator(api_version=args.api_version, leds=args.leds, faults=faults) as emulator:
+        t = Twinkly(host=emulator.address)
+        t._rt_port = emulator.rt_port
+        await t.interview()
+        await benchmark_requests(t, args.count, args.concurrency)
+        for version in (2, 3) if args.leds > 255 else (1, 2, 3):
+            await benchmark_realtime(t, emulator, version, args.count)
+        await t.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
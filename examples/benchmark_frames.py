@@ -0,0 +1,56 @@
+"""Benchmark realtime frame encoding and sending for each protocol version"""
+
+import argparse
+import asyncio
+import base64
+import os
+import random
+import time
+
+from ttls.client import Twinkly
+
+
+def generate_frames(n: int, leds: int, bytes_per_led: int) -> list:
+    """Generate random frames"""
+    return [[tuple(random.randrange(256) for _ in range(bytes_per_led)) for _ in range(leds)] for _ in range(n)]
+
+
+async def benchmark(t: Twinkly, name: str, label: str, frames: list, count: int) -> None:
+    send = getattr(t, name)
+    start = time.perf_counter()
+    for i in range(count):
+        await send(frames[i % len(frames)])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {label:<8} {count / elapsed:10.1f} frames/s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", metavar="hostname", default="127.0.0.1", help="Destination for frames")
+    parser.add_argument("--leds", metavar="n", type=int, default=600, help="Number of LEDs")
+    parser.add_argument("--bytes-per-led", metavar="n", type=int, default=3, help="Bytes per LED")
+    parser.add_argument("--count", metavar="n", type=int, default=2000, help="Number of frames per variant")
+    args = parser.parse_args()
+
+    # Pretend the device has already been interviewed and logged in, so that
+    # only the realtime path is measured.
+    t = Twinkly(host=args.host, api_version=1)
+    t._details = {"number_of_led": args.leds, "led_profile": "RGB" if args.bytes_per_led == 3 else "RGBW"}
+    t._token = base64.b64encode(os.urandom(8)).decode()
+    t._expires = t._refresh_at = time.time() + 3600
+
+    frames = generate_frames(10, args.leds, args.bytes_per_led)
+    buffers = [bytes(v for pixel in frame for v in pixel) for frame in frames]
+
+    variants = ["send_frame_2", "send_frame_3"]
+    if args.leds < 256:
+        variants.insert(0, "send_frame")
+    for name in variants:
+        await benchmark(t, name, "tuples", frames, args.count)
+        await benchmark(t, name, "buffer", buffers, args.count)
+
+    await t.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""Measure CLI import time with python -X importtime"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# What the ttls console script runs
+ENTRY_POINT = "import sys; from ttls.cli import main; sys.argv[0] = 'ttls'; sys.exit(main())"
+
+
+def importtime(argv: list[str]) -> dict[str, int]:
+    """Run the CLI and return cumulative import time in microseconds by module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", ENTRY_POINT, *argv],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", metavar="n", type=int, default=10, help="Number of runs per command")
+    args = parser.parse_args()
+
+    for argv in (["--help"], ["music", "--list"], ["--host", "192.0.2.1", "--help"]):
+        runs = [importtime(argv) for _ in range(args.runs)]
+        total = [sum(v for k, v in modules.items() if "." not in k) for modules in runs]
+        heavy = sorted({k for modules in runs for k in modules if k.split(".")[0] in ("aiohttp", "asyncio")})
+        print(
+            f"{' '.join(argv):<30} median {statistics.median(total) / 1000:6.1f} ms"
+            f"  heavy imports: {', '.join(heavy[:3]) or 'none'}{' ...' if len(heavy) > 3 else ''}"
+        )
+
+
+if __name__ == "__main__":
+    main()
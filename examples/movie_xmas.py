@@ -4,6 +4,7 @@ import argparse
 import random
 
 from ttls.client import TwinklyFrame
+from ttls.movie import TwinklyMovie
 
 RED = (0xFF, 0x00, 0x00)
 GREEN = (0x00, 0xFF, 0x00)
@@ -51,11 +52,7 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    movie = []
-
-    for _ in range(args.count):
-        frame = [v for sublist in generate_xmas_frame(args.leds) for v in sublist]
-        movie.extend(frame)
+    movie = TwinklyMovie.from_frames([generate_xmas_frame(args.leds) for _ in range(args.count)])
 
     with open(args.output, "wb") as f:
         f.write(bytes(movie))
@@ -3,7 +3,6 @@
 import argparse
 import asyncio
 import random
-import time
 
 from ttls.client import Twinkly, TwinklyFrame
 
@@ -36,24 +35,22 @@ async def main() -> None:
         help="Number of iterations",
     )
     parser.add_argument(
-        "--delay",
-        dest="delay",
-        metavar="seconds",
+        "--fps",
+        dest="fps",
+        metavar="n",
         type=float,
-        default=0.2,
+        default=None,
         required=False,
-        help="Delay between frames",
+        help="Frames per second (default: device frame rate)",
     )
     args = parser.parse_args()
 
     t = Twinkly(host=args.host)
-    await t.interview()
-    await t.set_mode("rt")
 
-    for _ in range(0, args.count):
-        frame = generate_xmas_frame(t.length)
-        await t.send_frame(frame)
-        time.sleep(args.delay)
+    async with t.realtime() as rt:
+        frames = (generate_xmas_frame(rt.length) for _ in range(args.count))
+        stats = await rt.play(frames, fps=args.fps)
+        print(f"{stats.fps:.1f} fps, {stats.frames_dropped} dropped, jitter {stats.jitter * 1000:.1f} ms")
 
     await t.close()
 
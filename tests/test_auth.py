@@ -0,0 +1,57 @@
+import asyncio
+import time
+import unittest
+
+import aiounittest
+
+from ttls.client import Twinkly
+
+
+class TwinklyLoginMock(Twinkly):
+    def __init__(self, *args, expires_in: int = 14400, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logins = 0
+        self.expires_in = expires_in
+
+    async def login(self) -> None:
+        self.logins += 1
+        await asyncio.sleep(0.01)
+        self._token = f"token{self.logins}"
+        self._expires = time.time() + self.expires_in
+        self._refresh_at = self._expires - min(self._token_refresh_margin, self.expires_in / 2)
+
+    async def verify_login(self) -> None:
+        pass
+
+
+class TestTwinklyAuth(aiounittest.AsyncTestCase):
+    async def test_single_flight(self):
+        t = TwinklyLoginMock(host="192.0.2.1", api_version=1)
+        tokens = await asyncio.gather(*(t.ensure_token() for _ in range(10)))
+        self.assertEqual(t.logins, 1)
+        self.assertEqual(set(tokens), {"token1"})
+        await t.refresh_token()
+        self.assertEqual(t.logins, 2)
+
+    async def test_refresh_margin(self):
+        t = TwinklyLoginMock(host="192.0.2.1", api_version=1, token_refresh_margin=30)
+        await t.ensure_token()
+        t._refresh_at = time.time() - 1
+        # Still valid, so the burst goes on with it while one login runs in the background
+        tokens = await asyncio.gather(*(t.ensure_token() for _ in range(10)))
+        self.assertEqual(set(tokens), {"token1"})
+        await t._refresh_task
+        self.assertEqual(t.logins, 2)
+        self.assertEqual(await t.ensure_token(), "token2")
+        self.assertEqual(t.logins, 2)
+
+    async def test_expired(self):
+        t = TwinklyLoginMock(host="192.0.2.1", api_version=1)
+        await t.ensure_token()
+        t._expires = t._refresh_at = time.time() - 1
+        self.assertEqual(await t.ensure_token(), "token2")
+        self.assertEqual(t.logins, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+import unittest
+from typing import Any
+
+import aiounittest
+
+from ttls.cache import TwinklyCache
+from ttls.client import TWINKLY_RETURN_CODE, TWINKLY_RETURN_CODE_OK, Twinkly
+from ttls.emulator import TwinklyEmulator
+
+
+class TwinklyCacheMock(Twinkly):
+    uuid = "00000000-0000-0000-0000-000000000001"
+
+    async def _get(self, endpoint: str, **kwargs) -> Any:
+        if endpoint == "gestalt":
+            return {"uuid": self.uuid, "number_of_led": 250, TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+        if endpoint == "led/mode":
+            return {"mode": "color", TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+    async def login(self) -> None:
+        self._token = "token"
+        self._expires = time.time() + 14400
+        self._refresh_at = self._expires - 60
+
+    async def verify_login(self) -> None:
+        pass
+
+
+class TestTwinklyCache(aiounittest.AsyncTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = TwinklyCache(os.path.join(self.tmp.name, "ttls", "devices.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_store_load(self):
+        self.assertEqual(self.cache.load("192.0.2.1"), {})
+        self.cache.store("192.0.2.1", api_version=2)
+        self.cache.store("192.0.2.1", token="token")
+        self.assertEqual(self.cache.load("192.0.2.1"), {"api_version": 2, "token": "token"})
+        self.assertEqual(os.stat(self.cache.path).st_mode & 0o777, 0o600)
+        self.cache.invalidate("192.0.2.1", "token", "expires")
+        self.assertEqual(self.cache.load("192.0.2.1"), {"api_version": 2})
+        self.cache.invalidate("192.0.2.1")
+        self.assertEqual(self.cache.load("192.0.2.1"), {})
+
+    async def test_client_cache(self):
+        t = TwinklyCacheMock(host="192.0.2.1", api_version=1, cache=self.cache)
+        await t.interview()
+        await t.ensure_token()
+
+        t = TwinklyCacheMock(host="192.0.2.1", cache=self.cache)
+        self.assertEqual(t._api_version, 1)
+        self.assertEqual(t.length, 250)
+        self.assertEqual(t.default_mode, "color")
+        self.assertEqual(t._headers["X-Auth-Token"], "token")
+
+    async def test_device_changed(self):
+        t = TwinklyCacheMock(host="192.0.2.1", api_version=1, cache=self.cache)
+        await t.interview()
+        await t.ensure_token()
+        t.uuid = "00000000-0000-0000-0000-000000000002"
+        await t.interview(force=True)
+        entry = self.cache.load("192.0.2.1")
+        self.assertEqual(entry["device_id"], t.uuid)
+        self.assertNotIn("token", entry)
+
+    async def test_device_replaced(self):
+        async with TwinklyEmulator(leds=100) as emulator:
+            t = Twinkly(host=emulator.address, cache=self.cache)
+            await t.interview()
+            await t.close()
+            t = Twinkly(host=emulator.address, cache=self.cache)
+            # Another device at the same address rejects the cached token
+            emulator.uuid, emulator.leds = "00000000-0000-0000-0000-000000000002", 200
+            emulator.tokens.clear()
+            await t.get_mode()
+            await t.interview()
+            await t.close()
+        self.assertEqual(t.length, 200)
+        self.assertEqual(self.cache.load(emulator.address)["device_id"], emulator.uuid)
+
+
+if __name__ == "__main__":
+    unittest.main()
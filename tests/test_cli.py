@@ -0,0 +1,111 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import aiounittest
+
+from ttls.cli import main_loop, read_hosts
+from ttls.emulator import TwinklyEmulator
+
+
+async def run_cli(*argv: str) -> tuple[int, str]:
+    """Run CLI and return exit code and output"""
+    output = io.StringIO()
+    code = 0
+    with mock.patch("sys.argv", ["ttls", *argv]), contextlib.redirect_stdout(output):
+        try:
+            await main_loop()
+        except SystemExit as e:
+            code = e.code
+    return code, output.getvalue()
+
+
+class TestCli(aiounittest.AsyncTestCase):
+    def test_read_hosts(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("192.0.2.1\n\n# comment\n192.0.2.2  # tree\n")
+        try:
+            self.assertEqual(read_hosts(f.name), ["192.0.2.1", "192.0.2.2"])
+        finally:
+            os.unlink(f.name)
+
+    async def test_single_host(self):
+        async with TwinklyEmulator() as emulator:
+            code, output = await run_cli("--host", emulator.address, "--json", "mode")
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(output), {"mode": "movie", "code": 1000})
+
+    async def test_multiple_hosts(self):
+        async with TwinklyEmulator(api_version=1) as a, TwinklyEmulator(api_version=2) as b:
+            code, output = await run_cli("--host", a.address, "--host", b.address, "--json", "mode", "--mode", "off")
+            self.assertEqual((a.mode, b.mode), ("off", "off"))
+        self.assertEqual(code, 0)
+        results = json.loads(output)
+        self.assertEqual(list(results), [a.address, b.address])
+        self.assertEqual(results[a.address], {"result": {"code": 1000}})
+
+    async def test_fail_on(self):
+        async with TwinklyEmulator() as emulator:
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+                f.write(f"{emulator.address}\n127.0.0.1:1\n")
+            try:
+                code, output = await run_cli("--hosts-file", f.name, "--json", "mode")
+                self.assertEqual(code, 1)
+                results = json.loads(output)
+                self.assertIn("result", results[emulator.address])
+                self.assertIn("error", results["127.0.0.1:1"])
+                code, _ = await run_cli("--hosts-file", f.name, "--fail-on", "all", "mode")
+                self.assertEqual(code, 0)
+            finally:
+                os.unlink(f.name)
+
+    async def test_music_list_offline(self):
+        code, output = await run_cli("--json", "music", "--list", "official")
+        self.assertEqual(code, 0)
+        self.assertIn("VU Meter", json.loads(output))
+
+
+# What the ttls console script runs
+ENTRY_POINT = "import sys; from ttls.cli import main; sys.argv[0] = 'ttls'; sys.exit(main())"
+
+
+def imported_modules(*argv: str) -> set[str]:
+    """Run CLI with -X importtime and return the modules it imported"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", ENTRY_POINT, *argv],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {line.rsplit("|", 1)[1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+
+
+class TestCliStartup(unittest.TestCase):
+    """Regression guard for CLI startup, which must not pay for the network stack"""
+
+    def assertLightweight(self, modules: set[str]) -> None:
+        self.assertIn("ttls.cli", modules)
+        for heavy in ("aiohttp", "asyncio", "ttls.client", "importlib.metadata"):
+            self.assertNotIn(heavy, modules)
+
+    def test_help(self):
+        self.assertLightweight(imported_modules("--help"))
+        self.assertLightweight(imported_modules("mode", "--help"))
+
+    def test_music_list(self):
+        self.assertLightweight(imported_modules("music", "--list"))
+
+    def test_no_unix_api(self):
+        # Windows has no os.getuid, which must only be needed by the daemon
+        code = "import os; del os.getuid; import ttls.client, ttls.cli; ttls.cli.create_parser().format_help()"
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -35,3 +35,8 @@ class TestTwinklyColours(unittest.TestCase):
 
         rgbw = TwinklyColour.from_twinkly_tuple((1, 2, 3, 4, 5))
         self.assertEqual(rgbw.as_dict(), {"blue": 5, "green": 4, "red": 3, "white": 2, "cold_white": 1})
+
+    def test_colours_from_dict(self):
+        self.assertEqual(TwinklyColour.from_dict({"red": 1, "green": 2, "blue": 3, "hue": 0}), TwinklyColour(1, 2, 3))
+        col = TwinklyColour(1, 2, 3, 4, 5)
+        self.assertEqual(TwinklyColour.from_dict(col.as_dict()), col)
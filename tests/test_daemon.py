@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import aiounittest
+from test_cli import run_cli
+
+from ttls.cli import COMMANDS
+from ttls.daemon import DAEMON_MAX_REQUEST, TwinklyDaemon, TwinklyDaemonError, default_socket_path, request
+from ttls.emulator import TwinklyEmulator
+
+
+class TestTwinklyDaemon(aiounittest.AsyncTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ttls.sock")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_warm_clients(self):
+        async with TwinklyEmulator() as emulator, TwinklyDaemon(COMMANDS, [emulator.address], path=self.path):
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+            # Interviewed at start
+            self.assertIn("GET led/mode", emulator.requests)
+            emulator.requests.clear()
+            results = await request([emulator.address], "mode", {"mode": "off"}, path=self.path)
+            self.assertTrue(results[emulator.address].ok)
+            results = await request([emulator.address], "mode", {"mode": None}, path=self.path)
+            self.assertEqual(results[emulator.address].result["mode"], "off")
+            self.assertEqual(emulator.requests, ["POST led/mode", "GET led/mode"])
+
+    async def test_new_host_and_errors(self):
+        async with TwinklyEmulator() as emulator, TwinklyDaemon(COMMANDS, path=self.path) as daemon:
+            results = await request([emulator.address, "127.0.0.1:1"], "summary", {}, path=self.path)
+            self.assertTrue(results[emulator.address].ok)
+            self.assertFalse(results["127.0.0.1:1"].ok)
+            self.assertEqual(len(daemon.group), 2)
+            with self.assertRaises(TwinklyDaemonError):
+                await request([emulator.address], "serve", {}, path=self.path)
+
+    async def test_socket_in_use(self):
+        async with TwinklyDaemon(COMMANDS, path=self.path):
+            with self.assertRaises(TwinklyDaemonError):
+                await TwinklyDaemon(COMMANDS, path=self.path).start()
+        self.assertFalse(os.path.exists(self.path))
+
+    async def test_default_path(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.tmp.name}):
+            self.assertEqual(default_socket_path(), os.path.join("/tmp", f"ttls-{os.getuid()}", "daemon.sock"))
+        path = os.path.join(self.tmp.name, "private", "daemon.sock")
+        with mock.patch("ttls.daemon.default_socket_path", return_value=path):
+            async with TwinklyEmulator() as emulator, TwinklyDaemon(COMMANDS):
+                self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+                results = await request([emulator.address], "mode", {"mode": None})
+                self.assertTrue(results[emulator.address].ok)
+            # A directory others can write to is refused
+            os.chmod(os.path.dirname(path), 0o777)
+            with self.assertRaises(TwinklyDaemonError):
+                await TwinklyDaemon(COMMANDS).start()
+
+    async def test_foreign_socket(self):
+        async with TwinklyDaemon(COMMANDS, path=self.path):
+            with (
+                mock.patch("ttls.daemon.os.getuid", return_value=os.getuid() + 1),
+                self.assertRaises(TwinklyDaemonError),
+            ):
+                await request(["192.0.2.1"], "mode", {}, path=self.path)
+
+    async def test_invalid_requests(self):
+        async with TwinklyDaemon(COMMANDS, path=self.path):
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            for line in (b"[1]", b'{"command": "mode", "hosts": [1]}', b'{"command": ["mode"], "hosts": ["a"]}'):
+                writer.write(line + b"\n")
+                self.assertIn("error", json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+
+    async def test_request_too_large(self):
+        async with TwinklyDaemon(COMMANDS, path=self.path):
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            writer.write(b'{"hosts": ["' + b"a" * DAEMON_MAX_REQUEST + b'"]}\n')
+            self.assertEqual(json.loads(await reader.readline()), {"error": "Request too large"})
+            writer.close()
+            await writer.wait_closed()
+
+    async def test_concurrent_clients(self):
+        async with TwinklyEmulator() as emulator, TwinklyDaemon(COMMANDS, [emulator.address], path=self.path):
+            results = await asyncio.gather(
+                *(request([emulator.address], "brightness", {"pct": None}, path=self.path) for _ in range(5))
+            )
+            self.assertTrue(all(r[emulator.address].ok for r in results))
+
+    async def test_via_daemon(self):
+        async with TwinklyEmulator() as emulator, TwinklyDaemon(COMMANDS, path=self.path):
+            code, output = await run_cli("--via-daemon", self.path, "--host", emulator.address, "--json", "mode")
+            self.assertEqual(code, 0)
+            self.assertEqual(json.loads(output)["mode"], "movie")
+        code, _ = await run_cli("--via-daemon", self.path, "--host", emulator.address, "mode")
+        self.assertEqual(code, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import time
+import unittest
+
+import aiounittest
+
+from ttls.cache import TwinklyCache
+from ttls.discovery import DEFAULT_REGISTRY_TTL, TwinklyRegistry, discover, parse_discovery_response
+from ttls.emulator import TwinklyEmulator
+
+
+class TestDiscovery(aiounittest.AsyncTestCase):
+    def test_parse(self):
+        self.assertEqual(parse_discovery_response(b"\x02\x00\x00\xc0OKTwinkly_ABC\x00"), ("192.0.0.2", "Twinkly_ABC"))
+        self.assertIsNone(parse_discovery_response(b"\x01discover"))
+        self.assertIsNone(parse_discovery_response(b"\x02\x00"))
+
+    async def test_discover(self):
+        async with TwinklyEmulator(name="Tree", discovery_port=0) as emulator:
+            found = await discover(timeout=0.1, address="127.0.0.1", port=emulator.discovery_port)
+        self.assertEqual(found, {"127.0.0.1": "Tree"})
+
+
+class TwinklyRegistryMock(TwinklyRegistry):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.probes = []
+
+    async def _probe(self, host: str, name: str) -> None:
+        self.probes.append(host)
+        self.cache.store(
+            host,
+            device_id=f"uuid-{name}",
+            api_version=2,
+            details={"uuid": f"uuid-{name}"},
+            name=name,
+            probed=time.time(),
+        )
+
+
+class TestTwinklyRegistry(aiounittest.AsyncTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = TwinklyCache(os.path.join(self.tmp.name, "devices.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_probe(self):
+        registry = TwinklyRegistry(self.cache)
+        async with TwinklyEmulator(api_version=2, leds=100, name="Tree") as emulator:
+            devices = await registry.refresh({emulator.address: "Tree"})
+            entry = devices[emulator.address]
+            self.assertEqual(entry["api_version"], 2)
+            self.assertEqual(entry["details"]["number_of_led"], 100)
+            self.assertEqual(entry["device_id"], emulator.uuid)
+            self.assertNotIn("POST login", emulator.requests)
+
+            # Built from the registry without probing
+            emulator.requests.clear()
+            t = registry.twinkly(emulator.address)
+            self.assertEqual(t.length, 100)
+            self.assertEqual(await t.get_api_version(), 2)
+            await t.close()
+            self.assertEqual(emulator.requests, [])
+
+    async def test_stale_api_version(self):
+        registry = TwinklyRegistry(self.cache)
+        async with TwinklyEmulator(api_version=2, leds=100) as emulator:
+            self.cache.store(
+                emulator.address,
+                device_id="old",
+                api_version=1,
+                details={"uuid": "old", "number_of_led": 50},
+                name="Twinkly",
+                probed=time.time() - 2 * DEFAULT_REGISTRY_TTL,
+            )
+            devices = await registry.refresh({emulator.address: "Twinkly"})
+        entry = devices[emulator.address]
+        self.assertEqual(entry["api_version"], 2)
+        self.assertEqual(entry["device_id"], emulator.uuid)
+        self.assertEqual(entry["details"]["number_of_led"], 100)
+
+    async def test_unauthorized(self):
+        registry = TwinklyRegistry(self.cache)
+        async with TwinklyEmulator(api_version=2, name="Tree") as emulator:
+            await registry.refresh({emulator.address: "Tree"})
+            t = registry.twinkly(emulator.address)
+            await t.get_mode()
+            # A rebooted device forgets its tokens, which must not forget the device
+            emulator.tokens.clear()
+            await t.get_mode()
+            await t.close()
+        entry = registry.devices[emulator.address]
+        self.assertEqual(entry["name"], "Tree")
+        self.assertEqual(entry["device_id"], emulator.uuid)
+        self.assertEqual(entry["token"], t._token)
+        self.assertEqual(list(registry.group().devices), [emulator.address])
+
+    async def test_incremental(self):
+        registry = TwinklyRegistryMock(self.cache, ttl=60)
+        await registry.refresh({"192.0.2.1": "a", "192.0.2.2": "b"})
+        self.assertEqual(sorted(registry.probes), ["192.0.2.1", "192.0.2.2"])
+
+        registry.probes.clear()
+        devices = await registry.refresh({"192.0.2.1": "a", "192.0.2.2": "renamed", "192.0.2.3": "c"})
+        self.assertEqual(sorted(registry.probes), ["192.0.2.2", "192.0.2.3"])
+        self.assertEqual(len(devices), 3)
+
+        registry.probes.clear()
+        self.cache.store("192.0.2.1", probed=time.time() - 120)
+        await registry.refresh({"192.0.2.1": "a"})
+        self.assertEqual(registry.probes, ["192.0.2.1"])
+        self.assertEqual(len(registry.devices), 3)
+
+    async def test_moved(self):
+        registry = TwinklyRegistry(self.cache)
+        async with TwinklyEmulator(api_version=1) as emulator:
+            self.cache.store("192.0.2.9", device_id=emulator.uuid, api_version=1, details={"uuid": emulator.uuid})
+            await registry.refresh({emulator.address: "Twinkly"})
+        self.assertEqual(list(registry.devices), [emulator.address])
+        self.assertEqual(self.cache.load("192.0.2.9"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import time
+import unittest
+
+import aiounittest
+
+from ttls.client import Twinkly
+from ttls.colours import TwinklyColour
+from ttls.emulator import TwinklyEmulator, TwinklyEmulatorFaults
+from ttls.movie import TwinklyMovie
+from ttls.retry import TwinklyRetryPolicy
+
+
+@contextlib.asynccontextmanager
+async def emulated(api_version: int = 1, faults: TwinklyEmulatorFaults | None = None, **kwargs):
+    async with TwinklyEmulator(api_version=api_version, faults=faults, seed=1, **kwargs) as emulator:
+        client = Twinkly(host=emulator.address)
+        client._rt_port = emulator.rt_port
+        try:
+            yield client, emulator
+        finally:
+            await client.close()
+
+
+class TestTwinklyEmulator(aiounittest.AsyncTestCase):
+    async def test_detect_and_login(self):
+        for api_version in (1, 2):
+            async with emulated(api_version) as (client, emulator):
+                self.assertEqual(await client.get_api_version(), api_version)
+                await client.interview()
+                self.assertEqual(client.length, emulator.leds)
+                self.assertEqual((await client.get_mode())["mode"], "movie")
+                self.assertIn("POST login", emulator.requests)
+                self.assertIn("POST verify", emulator.requests)
+
+    async def test_state(self):
+        for api_version in (1, 2):
+            async with emulated(api_version) as (client, emulator):
+                await client.set_brightness(42)
+                await client.set_static_colour(TwinklyColour(10, 20, 30))
+                self.assertEqual(emulator.mode, "color")
+                self.assertEqual(emulator.colour, {"red": 10, "green": 20, "blue": 30})
+                state = await client.refresh_state()
+                self.assertEqual(state.mode, "color")
+                self.assertEqual(state.brightness, 42)
+                self.assertEqual(state.colour, TwinklyColour(10, 20, 30))
+
+    async def test_unauthorized(self):
+        async with emulated() as (client, emulator):
+            await client.get_mode()
+            emulator.tokens.clear()
+            await client.get_mode()
+            self.assertEqual(emulator.requests.count("POST login"), 2)
+
+    async def test_movie(self):
+        async with emulated(leds=10) as (client, emulator):
+            await client.interview()
+            movie = TwinklyMovie.from_frames([[(255, 0, 0)] * 10, [(0, 255, 0)] * 10])
+            await client.set_movie(movie)
+            self.assertEqual(emulator.movie, movie.data)
+            self.assertEqual(emulator.movie_config["frames_number"], 2)
+            await client.apply_movie(movie)
+            await client.apply_movie(movie)
+            self.assertEqual(emulator.requests.count("POST movies/full"), 1)
+            self.assertEqual((await client.get_current_movie())["unique_id"], movie.unique_id)
+
+    async def test_realtime(self):
+        for version in (2, 3):
+            async with emulated(api_version=2, leds=400) as (client, emulator):
+                frame = [(1, 2, 3)] * 200 + [(4, 5, 6)] * 200
+                async with client.realtime(version=version) as rt:
+                    for _ in range(3):
+                        rt.send(frame)
+                        await asyncio.sleep(0.01)
+                    await asyncio.sleep(0.05)
+                self.assertEqual(emulator.frames[version], 3)
+                self.assertEqual(emulator.datagrams[version], 6)
+                self.assertEqual(bytes(emulator.frame), bytes(v for pixel in frame for v in pixel))
+
+    async def test_realtime_bytes_per_led(self):
+        async with emulated(leds=600) as (client, emulator):
+            await client.set_mode("rt")
+            with self.assertRaises(ValueError):
+                await client.send_frame(bytes(600 * 4))
+            await asyncio.sleep(0.05)
+            self.assertEqual(emulator.datagrams[1], 0)
+
+    async def test_realtime_requires_rt_mode(self):
+        async with emulated(leds=10) as (client, emulator):
+            await client.interview()
+            await client.send_frame([(1, 2, 3)] * 10)
+            await asyncio.sleep(0.05)
+            self.assertEqual(emulator.frames[1], 0)
+            self.assertEqual(emulator.rejected, 1)
+            await client.set_mode("rt")
+            await client.send_frame([(1, 2, 3)] * 10)
+            await asyncio.sleep(0.05)
+            self.assertEqual(emulator.frames[1], 1)
+
+    async def test_radio_sleep(self):
+        faults = TwinklyEmulatorFaults(sleep_after=0.05, wake_latency=0.5)
+        async with emulated(faults=faults) as (client, emulator):
+            client.retry = TwinklyRetryPolicy(first_timeout=0.2, backoff=0.01, idle_after=0.05)
+            await client.get_mode()
+            await asyncio.sleep(0.1)
+            start = time.monotonic()
+            await client.get_brightness()
+            # The retry is sent to the radio woken by the first attempt
+            self.assertLess(time.monotonic() - start, 0.5)
+            self.assertEqual(emulator.requests.count("GET led/out/brightness"), 2)
+
+    async def test_slow_awake(self):
+        async with emulated() as (client, emulator):
+            client.retry = TwinklyRetryPolicy(first_timeout=0.2, backoff=0.01)
+            await client.get_mode()
+            # An awake device slower than the short timeout is waited for, not asked again
+            emulator.faults.latency = 0.3
+            await client.get_brightness()
+            self.assertEqual(emulator.requests.count("GET led/out/brightness"), 1)
+
+    async def test_disconnect(self):
+        faults = TwinklyEmulatorFaults(disconnect_rate=0.3)
+        async with emulated(faults=faults) as (client, emulator):
+            client.retry = TwinklyRetryPolicy(attempts=10, backoff=0.001)
+            for _ in range(20):
+                self.assertEqual((await client.get_mode())["mode"], "movie")
+            self.assertGreater(len(emulator.requests), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import unittest
 import uuid
@@ -169,5 +170,35 @@ class TestTwinklyGeneric(aiounittest.AsyncTestCase):
         assert "Invalid response from Twinkly" in str(e.value)
 
 
+class TwinklyProbeMock(Twinkly):
+    def __init__(self, *args, answers: dict[int, float], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.answers = answers
+        self.probes = []
+
+    async def _probe_api_version(self, version: int) -> Any:
+        self.probes.append(version)
+        await asyncio.sleep(self.answers.get(version, 0.01))
+        if version not in self.answers:
+            raise TwinklyError("Invalid response from Twinkly")
+        return {TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+
+class TestTwinklyDetect(aiounittest.AsyncTestCase):
+    async def test_detect_v2(self):
+        t = TwinklyProbeMock(host="192.0.2.1", answers={2: 0.01})
+        versions = await asyncio.gather(*(t.get_api_version() for _ in range(5)))
+        self.assertEqual(versions, [2] * 5)
+        self.assertEqual(sorted(t.probes), [1, 2])
+
+    async def test_detect_first_wins(self):
+        t = TwinklyProbeMock(host="192.0.2.1", answers={1: 0.5, 2: 0.01})
+        self.assertEqual(await t.detect_api_version(), 2)
+
+    async def test_detect_none(self):
+        t = TwinklyProbeMock(host="192.0.2.1", answers={})
+        self.assertIsNone(await t.detect_api_version())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import aiounittest
+
+from ttls.client import Twinkly
+from ttls.group import TwinklyGroup
+
+
+class TwinklyGroupMock(Twinkly):
+    async def set_mode(self, mode: str):
+        if self.host == "192.0.2.2":
+            raise ConnectionError("Device unreachable")
+        return {"mode": mode}
+
+
+class TestTwinklyGroup(aiounittest.AsyncTestCase):
+    async def test_shared_resources(self):
+        async with TwinklyGroup(["192.0.2.1", "192.0.2.2"]) as group:
+            session = group._get_session()
+            for device in group.devices.values():
+                self.assertIs(device._session, session)
+                self.assertIs(device._endpoint, group._endpoint)
+        self.assertTrue(session.closed)
+
+    async def test_run_results(self):
+        hosts = ["192.0.2.1", "192.0.2.2", "192.0.2.3"]
+        async with TwinklyGroup(hosts, concurrency=2) as group:
+            group.devices = {host: TwinklyGroupMock(host=host, endpoint=group._endpoint) for host in hosts}
+            results = await group.set_mode("off")
+        self.assertEqual(list(results), hosts)
+        self.assertTrue(results["192.0.2.1"].ok)
+        self.assertEqual(results["192.0.2.1"].result, {"mode": "off"})
+        self.assertFalse(results["192.0.2.2"].ok)
+        self.assertIsInstance(results["192.0.2.2"].error, ConnectionError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+
+import aiounittest
+
+from ttls.limiter import PRIORITY_HIGH, PRIORITY_LOW, TwinklyRequestLimiter
+
+
+class TestTwinklyRequestLimiter(aiounittest.AsyncTestCase):
+    async def test_limit(self):
+        limiter = TwinklyRequestLimiter(limit=2)
+        running = []
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with limiter.slot():
+                running.append(1)
+                peak = max(peak, len(running))
+                await asyncio.sleep(0.01)
+                running.pop()
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.requests, 6)
+        self.assertEqual(limiter.max_queue_depth, 4)
+        self.assertEqual(limiter.active, 0)
+        self.assertGreater(limiter.max_wait, 0)
+
+    async def test_priority(self):
+        limiter = TwinklyRequestLimiter(limit=1)
+        order = []
+
+        async def request(name, priority):
+            async with limiter.slot(priority):
+                order.append(name)
+
+        await limiter.acquire()
+        tasks = [
+            asyncio.ensure_future(request("low", PRIORITY_LOW)),
+            asyncio.ensure_future(request("normal", 10)),
+            asyncio.ensure_future(request("high", PRIORITY_HIGH)),
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.queue_depth, 3)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["high", "normal", "low"])
+
+    async def test_cancel(self):
+        limiter = TwinklyRequestLimiter(limit=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.queue_depth, 0)
+        limiter.release()
+        self.assertEqual(limiter.active, 0)
+        async with limiter.slot():
+            self.assertEqual(limiter.active, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from typing import Any
+
+import aiounittest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from ttls.client import TWINKLY_RETURN_CODE, TWINKLY_RETURN_CODE_OK, Twinkly
+from ttls.colours import TwinklyColour
+from ttls.movie import TwinklyMovie, TwinklyMovieStream, movie_frames
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestTwinklyMovieStream(aiounittest.AsyncTestCase):
+    async def collect(self, stream):
+        return b"".join([chunk async for chunk in stream])
+
+    async def test_sources(self):
+        movie = bytes(range(256)) * 10
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(movie)
+        try:
+            for source in (movie, f.name, io.BytesIO(movie)):
+                stream = TwinklyMovieStream(source, chunk_size=1000)
+                self.assertEqual(stream.size, len(movie))
+                self.assertTrue(stream.replayable)
+                self.assertEqual(await self.collect(stream), movie)
+                self.assertEqual(await self.collect(stream), movie)
+        finally:
+            os.unlink(f.name)
+
+    async def test_async_iterator(self):
+        async def chunks():
+            yield b"abc"
+            yield b"def"
+
+        progress = []
+        stream = TwinklyMovieStream(chunks(), progress=progress.append)
+        self.assertIsNone(stream.size)
+        self.assertEqual(await self.collect(stream), b"abcdef")
+        self.assertEqual([p.sent for p in progress], [3, 6])
+        with self.assertRaises(RuntimeError):
+            stream.__aiter__()
+
+    async def test_size(self):
+        async def chunks():
+            yield b"abc"
+            yield b"def"
+
+        progress = []
+        stream = TwinklyMovieStream(chunks(), progress=progress.append, size=6)
+        self.assertEqual(await self.collect(stream), b"abcdef")
+        self.assertEqual(progress[-1].total, 6)
+        for size in (5, 7):
+            with self.assertRaises(ValueError):
+                await self.collect(TwinklyMovieStream(chunks(), size=size))
+
+    def test_movie_frames(self):
+        self.assertEqual(movie_frames(3000, 250, 3), 4)
+        self.assertEqual(movie_frames(4000, 250, 4), 4)
+        with self.assertRaises(ValueError):
+            movie_frames(3001, 250, 3)
+
+
+class TestTwinklyMovie(unittest.TestCase):
+    def test_from_buffer(self):
+        colours = [TwinklyColour(1, 2, 3, 4), TwinklyColour(5, 6, 7, 8)]
+        movie = TwinklyMovie.from_array(bytes(v for c in colours for v in c), leds=1, channels=4)
+        self.assertEqual(movie.data, bytes(v for c in colours for v in c.as_twinkly_tuple()))
+        self.assertEqual(movie.config, {"frames_number": 2, "loop_type": 0, "frame_delay": 100, "leds_number": 1})
+
+    def test_from_buffer_twinkly_order(self):
+        movie = TwinklyMovie.from_array(bytes(range(10)), leds=2, channels=5, twinkly_order=True)
+        self.assertEqual(movie.data, bytes(range(10)))
+        self.assertEqual(movie.frames, 1)
+
+    def test_from_memoryview(self):
+        # Two frames of three RGBW LEDs, without NumPy
+        view = memoryview(bytes(range(24))).cast("B", (2, 3, 4))
+        movie = TwinklyMovie.from_array(view)
+        self.assertEqual(movie.leds, 3)
+        self.assertEqual(movie.frames, 2)
+        self.assertEqual(movie.data[:4], bytes([3, 0, 1, 2]))
+
+    def test_from_frames(self):
+        movie = TwinklyMovie.from_frames([[(1, 2, 3), (4, 5, 6)], [(7, 8, 9), (10, 11, 12)]], frame_delay=50)
+        self.assertEqual(movie.data, bytes(range(1, 13)))
+        self.assertEqual(movie.config, {"frames_number": 2, "loop_type": 0, "frame_delay": 50, "leds_number": 2})
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            TwinklyMovie.from_array(bytes(10), leds=3)
+        with self.assertRaises(ValueError):
+            TwinklyMovie.from_array(bytes(12), leds=2, channels=6)
+
+    @unittest.skipUnless(numpy, "numpy not installed")
+    def test_from_numpy(self):
+        array = numpy.arange(2 * 3 * 5, dtype=numpy.uint8).reshape(2, 3, 5)
+        movie = TwinklyMovie.from_array(array)
+        colours = [TwinklyColour(*map(int, pixel)) for pixel in array.reshape(-1, 5)]
+        self.assertEqual(movie.data, bytes(v for c in colours for v in c.as_twinkly_tuple()))
+        self.assertEqual(movie.frames, 2)
+        self.assertEqual(movie.leds, 3)
+        with self.assertRaises(TypeError):
+            TwinklyMovie.from_array(array.astype(numpy.uint16))
+
+
+class TestTwinklyUploadMovie(aiounittest.AsyncTestCase):
+    async def test_upload(self):
+        received = []
+
+        async def movie_full(request):
+            received.append((request.headers.get("Content-Length"), await request.read()))
+            return web.json_response({"frames_number": 4, "code": 1000})
+
+        app = web.Application()
+        app.router.add_post("/xled/v1/led/movie/full", movie_full)
+        async with TestServer(app) as server:
+            t = Twinkly(host=f"{server.host}:{server.port}", api_version=1)
+            t._token = "token"
+            t._expires = t._refresh_at = time.time() + 3600
+            movie = bytes(3000)
+            progress = []
+            res = await t.upload_movie(io.BytesIO(movie), progress=progress.append)
+            self.assertEqual(res["frames_number"], 4)
+            self.assertEqual(received, [("3000", movie)])
+            self.assertEqual(progress[-1].sent, 3000)
+            self.assertEqual(progress[-1].total, 3000)
+
+            async def chunks():
+                yield movie[:1000]
+                yield movie[1000:]
+
+            with self.assertRaises(ValueError):
+                await t.upload_movie(chunks())
+            received.clear()
+            await t.upload_movie(chunks(), size=3000)
+            self.assertEqual(received, [("3000", movie)])
+            await t.close()
+
+
+class TwinklyMovieStoreMock(Twinkly):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._details = {"number_of_led": 2, "max_movies": 2, "movie_capacity": 100}
+        self.stored = []
+        self.requests = []
+
+    async def _get(self, endpoint: str, **kwargs) -> Any:
+        if endpoint == "movies":
+            return {"movies": list(self.stored), TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+    async def _post(self, endpoint: str, **kwargs) -> Any:
+        self.requests.append(endpoint)
+        if endpoint == "movies/new":
+            self.stored.append({"id": len(self.stored), **kwargs["json"]})
+        return {TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+    async def _delete(self, endpoint: str, **kwargs) -> Any:
+        self.requests.append(f"DELETE {endpoint}")
+        self.stored = []
+        return {TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+
+class TestTwinklyApplyMovie(aiounittest.AsyncTestCase):
+    async def test_dedup(self):
+        t = TwinklyMovieStoreMock(host="192.0.2.1", api_version=1)
+        movie = TwinklyMovie(bytes(12), leds=2)
+        await t.apply_movie(movie)
+        self.assertEqual(t.requests, ["movies/new", "movies/full", "movies/current", "led/mode"])
+        t.requests = []
+        await t.apply_movie(TwinklyMovie(bytes(12), leds=2))
+        self.assertEqual(t.requests, ["movies/current", "led/mode"])
+        self.assertEqual(movie.unique_id, TwinklyMovie(bytes(12), leds=2).unique_id)
+        self.assertNotEqual(movie.unique_id, TwinklyMovie(bytes(12), leds=2, frame_delay=50).unique_id)
+
+    async def test_evict(self):
+        t = TwinklyMovieStoreMock(host="192.0.2.1", api_version=1)
+        for i in range(3):
+            await t.apply_movie(TwinklyMovie(bytes([i]) * 6, leds=2))
+        self.assertIn("DELETE movies", t.requests)
+        self.assertEqual(len(t.stored), 1)
+        self.assertEqual(t._movies, {t.stored[0]["unique_id"]})
+
+    async def test_unknown_movies_kept(self):
+        t = TwinklyMovieStoreMock(host="192.0.2.1", api_version=1)
+        t.stored = [{"id": 0, "unique_id": "A", "frames_number": 100}]
+        await t.apply_movie(TwinklyMovie(bytes(6), leds=2))
+        self.assertNotIn("DELETE movies", t.requests)
+        self.assertEqual(t.requests, ["led/movie/full", "led/movie/config", "led/mode"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import contextlib
+import time
+import unittest
+from unittest import mock
+
+import aiounittest
+
+from ttls.client import Twinkly
+from ttls.realtime import (
+    RT_PAYLOAD_MAX_LIGHTS,
+    TwinklyBroadcastSession,
+    TwinklyDatagramEndpoint,
+    TwinklyFrameEncoder,
+    TwinklyFrameScheduler,
+    TwinklyPixelMap,
+)
+
+TOKEN = base64.b64encode(bytes(range(8))).decode()
+
+
+class TestTwinklyFrameEncoder(unittest.TestCase):
+    def test_encode_v1(self):
+        encoder = TwinklyFrameEncoder(3, version=1)
+        encoder.set_token(TOKEN)
+        frame = [(1, 2, 3), (4, 5, 6), (7, 8, 9)]
+        datagrams = encoder.encode(frame)
+        expected = bytes([0x01]) + bytes(range(8)) + bytes([3]) + bytes(range(1, 10))
+        self.assertEqual([bytes(d) for d in datagrams], [expected])
+        self.assertEqual(bytes(encoder.encode(bytes(range(1, 10)))[0]), expected)
+
+    def test_encode_segments(self):
+        length = RT_PAYLOAD_MAX_LIGHTS + 10
+        frame = [(i % 256, 0, 0, 0) for i in range(length)]
+        for version, first in [(2, 2), (3, 3)]:
+            encoder = TwinklyFrameEncoder(length, version=version)
+            encoder.set_token(TOKEN)
+            datagrams = [bytes(d) for d in encoder.encode(frame)]
+            self.assertEqual(len(datagrams), 2)
+            for i, datagram in enumerate(datagrams):
+                self.assertEqual(datagram[:12], bytes([first]) + bytes(range(8)) + bytes([0, 0, i]))
+            self.assertEqual(len(datagrams[0]), 12 + RT_PAYLOAD_MAX_LIGHTS * 4)
+            self.assertEqual(len(datagrams[1]), 12 + 10 * 4)
+            self.assertEqual(datagrams[1][12:16], bytes([RT_PAYLOAD_MAX_LIGHTS % 256, 0, 0, 0]))
+
+    def test_token_change(self):
+        encoder = TwinklyFrameEncoder(1, version=1)
+        encoder.set_token(TOKEN)
+        self.assertEqual(bytes(encoder.encode([(1, 2, 3)])[0])[1:9], bytes(range(8)))
+        encoder.set_token(base64.b64encode(bytes(8)).decode())
+        self.assertEqual(bytes(encoder.encode([(1, 2, 3)])[0])[1:9], bytes(8))
+
+    def test_invalid_length(self):
+        encoder = TwinklyFrameEncoder(2, version=1)
+        encoder.set_token(TOKEN)
+        with self.assertRaises(ValueError):
+            encoder.encode([(1, 2, 3)])
+        with self.assertRaises(ValueError):
+            encoder.encode(bytes(5))
+
+    def test_bytes_per_led(self):
+        encoder = TwinklyFrameEncoder(2, version=1, bytes_per_led=3)
+        encoder.set_token(TOKEN)
+        self.assertEqual(len(encoder.encode(bytes(6))[0]), 10 + 6)
+        # An RGBW frame for an RGB device is not sent as garbage
+        with self.assertRaises(ValueError):
+            encoder.encode(bytes(8))
+        with self.assertRaises(ValueError):
+            encoder.encode([(1, 2, 3, 4), (5, 6, 7, 8)])
+
+
+class _Receiver(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait(data)
+
+
+class TestTwinklyDatagramEndpoint(aiounittest.AsyncTestCase):
+    async def test_sendto(self):
+        loop = asyncio.get_running_loop()
+        transport, receiver = await loop.create_datagram_endpoint(_Receiver, local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info("sockname")[1]
+        endpoint = TwinklyDatagramEndpoint()
+        await endpoint.open()
+        address = await endpoint.resolve("localhost", port)
+        endpoint.sendto(memoryview(b"frame"), address)
+        await endpoint.drain()
+        self.assertEqual(await asyncio.wait_for(receiver.queue.get(), 1), b"frame")
+        endpoint.close()
+        self.assertFalse(endpoint.is_open)
+        with self.assertRaises(ConnectionError):
+            endpoint.sendto(b"frame", address)
+        transport.close()
+
+
+class TwinklyRealtimeMock(Twinkly):
+    def __init__(self, *args, length: int = 2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._details = {"number_of_led": length, "led_profile": "RGB"}
+        self._token = TOKEN
+        self._expires = self._refresh_at = time.time() + 3600
+        self.modes = []
+        self.refreshed = 0
+
+    async def set_mode(self, mode: str):
+        self.modes.append(mode)
+
+    async def refresh_token(self) -> None:
+        self.refreshed += 1
+        self._token = base64.b64encode(bytes(8)).decode()
+        self._expires = self._refresh_at = time.time() + 3600
+
+
+class TestTwinklyRealtimeSession(aiounittest.AsyncTestCase):
+    async def test_session(self):
+        loop = asyncio.get_running_loop()
+        transport, receiver = await loop.create_datagram_endpoint(_Receiver, local_addr=("127.0.0.1", 0))
+        t = TwinklyRealtimeMock(host="127.0.0.1", api_version=1)
+        t._rt_port = transport.get_extra_info("sockname")[1]
+        async with t.realtime() as rt:
+            self.assertEqual(t.modes, ["rt"])
+            rt.send([(1, 2, 3), (4, 5, 6)])
+            data = await asyncio.wait_for(receiver.queue.get(), 1)
+            self.assertEqual(data[1:9], bytes(range(8)))
+            self.assertEqual(data[10:], bytes([1, 2, 3, 4, 5, 6]))
+            self.assertEqual(rt.frames_sent, 1)
+            # Logged in again, e.g. after a rejected HTTP request
+            t._token = base64.b64encode(bytes(8)).decode()
+            rt.send([(1, 2, 3), (4, 5, 6)])
+            data = await asyncio.wait_for(receiver.queue.get(), 1)
+            self.assertEqual(data[1:9], bytes(8))
+        await t.close()
+        transport.close()
+
+    async def test_token_refresh(self):
+        t = TwinklyRealtimeMock(host="127.0.0.1", api_version=1)
+        t._expires = t._refresh_at = time.time() + 0.05
+        async with t.realtime(refresh_margin=0) as rt:
+            await asyncio.sleep(0.2)
+            self.assertEqual(t.refreshed, 1)
+            self.assertEqual(rt._encoder._token, t._token)
+        await t.close()
+
+    async def test_token_refresh_short_lifetime(self):
+        t = TwinklyRealtimeMock(host="127.0.0.1", api_version=1)
+        t._expires = t._refresh_at = time.time() + 0.05
+        # A margin longer than the token lifetime must not refresh back to back
+        async with t.realtime(refresh_margin=2 * 3600):
+            await asyncio.sleep(0.2)
+            self.assertEqual(t.refreshed, 1)
+        await t.close()
+
+
+class TestTwinklyBroadcastSession(aiounittest.AsyncTestCase):
+    def test_pixel_map(self):
+        pixel_map = TwinklyPixelMap([("a", 2), ("b", 3)])
+        self.assertEqual(pixel_map.length, 5)
+        self.assertEqual(pixel_map.locate(0), ("a", 0))
+        self.assertEqual(pixel_map.locate(1), ("a", 1))
+        self.assertEqual(pixel_map.locate(2), ("b", 0))
+        self.assertEqual(pixel_map.locate(4), ("b", 2))
+        self.assertEqual(pixel_map.ranges(), [("a", 0, 2), ("b", 2, 5)])
+        with self.assertRaises(IndexError):
+            pixel_map.locate(5)
+
+    async def test_broadcast(self):
+        loop = asyncio.get_running_loop()
+        endpoint = TwinklyDatagramEndpoint()
+        receivers = []
+        devices = []
+        for length in (2, 3):
+            transport, receiver = await loop.create_datagram_endpoint(_Receiver, local_addr=("127.0.0.1", 0))
+            receivers.append((transport, receiver))
+            t = TwinklyRealtimeMock(host="127.0.0.1", api_version=1, length=length, endpoint=endpoint)
+            t._rt_port = transport.get_extra_info("sockname")[1]
+            devices.append(t)
+        async with TwinklyBroadcastSession(devices, version=3) as rt:
+            self.assertEqual(rt.length, 5)
+            rt.send(bytes(range(15)))
+            first = await asyncio.wait_for(receivers[0][1].queue.get(), 1)
+            second = await asyncio.wait_for(receivers[1][1].queue.get(), 1)
+            self.assertEqual(first[12:], bytes(range(6)))
+            self.assertEqual(second[12:], bytes(range(6, 15)))
+            self.assertEqual(rt.stats.frames, 1)
+            self.assertGreaterEqual(rt.stats.max_skew, 0)
+        endpoint.close()
+        for transport, _ in receivers:
+            transport.close()
+
+
+class _SessionMock:
+    def __init__(self):
+        self.frames = []
+        self.sent_at = []
+
+    def send(self, frame):
+        self.frames.append(frame)
+        self.sent_at.append(asyncio.get_running_loop().time())
+
+    async def drain(self):
+        pass
+
+
+class _FakeClock:
+    """Event loop clock advanced by sleeping, for deterministic pacing tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.now += delay
+
+    @contextlib.contextmanager
+    def patch(self):
+        with mock.patch.object(asyncio.get_running_loop(), "time", self.time), mock.patch("asyncio.sleep", self.sleep):
+            yield self
+
+
+class TestTwinklyFrameScheduler(aiounittest.AsyncTestCase):
+    async def test_pacing(self):
+        session = _SessionMock()
+        with _FakeClock().patch():
+            stats = await TwinklyFrameScheduler(session, fps=100).run(range(10))
+        self.assertEqual(session.frames, list(range(10)))
+        self.assertEqual(stats.frames_sent, 10)
+        self.assertEqual(stats.frames_dropped, 0)
+        self.assertEqual(stats.jitter, 0)
+        # Every frame is sent in its own slot
+        for i, sent_at in enumerate(session.sent_at):
+            self.assertAlmostEqual(sent_at, i * 0.01)
+
+    async def test_drop(self):
+        async def producer():
+            for i in range(5):
+                if i == 2:
+                    await asyncio.sleep(0.035)
+                yield i
+
+        session = _SessionMock()
+        with _FakeClock().patch():
+            stats = await TwinklyFrameScheduler(session, fps=100).run(producer())
+        self.assertEqual(session.frames, list(range(5)))
+        # Slots 2 and 3 passed while the producer was late
+        self.assertEqual(stats.frames_dropped, 2)
+        self.assertAlmostEqual(session.sent_at[3], 0.05)
+
+    async def test_count(self):
+        session = _SessionMock()
+        stats = await TwinklyFrameScheduler(session, fps=1000).run(iter(int, 1), count=3)
+        self.assertEqual(stats.frames_sent, 3)
@@ -0,0 +1,190 @@
+import asyncio
+import contextlib
+import time
+import unittest
+
+import aiounittest
+from aiohttp import ClientTimeout, ServerDisconnectedError, web
+from aiohttp.test_utils import TestServer
+
+from ttls.client import Twinkly
+from ttls.retry import TwinklyRetryPolicy
+
+
+class TwinklyServer:
+    """Minimal stand-in for the device HTTP API"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.mode = "movie"
+        self.stalls = 0
+        self.stall_delay = 0.5
+        self.peers = []
+        self.drop_pooled = 0
+        self.app = web.Application()
+        self.app.router.add_get("/xled/v1/led/mode", self.get_mode)
+        self.app.router.add_post("/xled/v1/led/mode", self.set_mode)
+        self.app.router.add_get("/xled/v1/led/out/brightness", self.get_brightness)
+        self.app.router.add_post("/xled/v1/music/drivers/next", self.next_driver)
+
+    async def get_mode(self, request):
+        self.requests.append("GET led/mode")
+        await self.stall()
+        mode = self.mode
+        await asyncio.sleep(self.delay)
+        return web.json_response({"mode": mode, "code": 1000})
+
+    async def stall(self):
+        """Simulate a sleeping radio by delaying the next requests"""
+        if self.stalls:
+            self.stalls -= 1
+            await asyncio.sleep(self.stall_delay)
+
+    async def get_brightness(self, request):
+        self.requests.append("GET led/out/brightness")
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return web.json_response({"mode": "enabled", "value": 100, "code": 1000})
+
+    async def set_mode(self, request):
+        self.requests.append("POST led/mode")
+        await self.stall()
+        peer = request.transport.get_extra_info("peername")
+        if self.drop_pooled and peer in self.peers:
+            # Close a kept-alive connection without answering, like a device
+            # that dropped it while idle
+            self.drop_pooled -= 1
+            request.transport.close()
+            return web.Response()
+        self.peers.append(peer)
+        self.mode = (await request.json())["mode"]
+        return web.json_response({"code": 1000})
+
+    async def next_driver(self, request):
+        self.requests.append("POST music/drivers/next")
+        peer = request.transport.get_extra_info("peername")
+        if self.drop_pooled and peer in self.peers:
+            # Act on the request, then drop the connection before answering
+            self.drop_pooled -= 1
+            request.transport.close()
+            return web.Response()
+        self.peers.append(peer)
+        return web.json_response({"code": 1000})
+
+
+@contextlib.asynccontextmanager
+async def twinkly_server(**kwargs):
+    device = TwinklyServer(**kwargs)
+    async with TestServer(device.app) as server:
+        client = Twinkly(host=f"{server.host}:{server.port}", api_version=1)
+        client._token = "token"
+        client._expires = client._refresh_at = time.time() + 3600
+        try:
+            yield client, device
+        finally:
+            await client.close()
+
+
+class TestTwinklyRequests(aiounittest.AsyncTestCase):
+    async def test_coalesce_get(self):
+        async with twinkly_server() as (client, device):
+            results = await asyncio.gather(*(client.get_mode() for _ in range(5)))
+            self.assertEqual([r["mode"] for r in results], ["movie"] * 5)
+            self.assertEqual(device.requests, ["GET led/mode"])
+            self.assertEqual(client._inflight, {})
+
+    async def test_post_bypasses_coalescing(self):
+        async with twinkly_server() as (client, device):
+            first = asyncio.ensure_future(client.get_mode())
+            await asyncio.sleep(0.01)
+            await client.set_mode("off")
+            second = await client.get_mode()
+            self.assertEqual((await first)["mode"], "movie")
+            self.assertEqual(second["mode"], "off")
+            self.assertEqual(device.requests, ["GET led/mode", "POST led/mode", "GET led/mode"])
+
+    async def test_concurrency_limit(self):
+        async with twinkly_server(delay=0.01) as (client, device):
+            await asyncio.gather(*(client._get("led/out/brightness", params={"n": i}) for i in range(4)))
+            self.assertEqual(device.max_active, 1)
+            self.assertEqual(client.limiter.requests, 4)
+            self.assertEqual(client.limiter.max_queue_depth, 3)
+
+    async def test_retry_get(self):
+        async with twinkly_server() as (client, device):
+            client.retry = TwinklyRetryPolicy(first_timeout=0.1, backoff=0.01)
+            device.stalls = 1
+            start = time.monotonic()
+            self.assertEqual((await client.get_mode())["mode"], "movie")
+            self.assertLess(time.monotonic() - start, device.stall_delay)
+            self.assertEqual(device.requests, ["GET led/mode"] * 2)
+
+    async def test_retry_exhausted(self):
+        async with twinkly_server() as (client, device):
+            client.retry = TwinklyRetryPolicy(attempts=2, first_timeout=0.1, backoff=0.01)
+            client._timeout = ClientTimeout(total=0.1)
+            device.stalls = 2
+            with self.assertRaises(TimeoutError):
+                await client.get_mode()
+            self.assertEqual(device.requests, ["GET led/mode"] * 2)
+
+    async def test_retry_idempotent_post(self):
+        async with twinkly_server() as (client, device):
+            client.retry = TwinklyRetryPolicy(first_timeout=0.1, backoff=0.01)
+            device.stalls = 1
+            await client.set_mode("off")
+            self.assertEqual(device.requests, ["POST led/mode"] * 2)
+            self.assertEqual(device.mode, "off")
+
+    async def test_no_retry_post(self):
+        async with twinkly_server() as (client, device):
+            client.retry = TwinklyRetryPolicy(first_timeout=0.1, backoff=0.01)
+            client._timeout = ClientTimeout(total=0.2)
+            device.stalls = 1
+            with self.assertRaises(TimeoutError):
+                await client._post("led/mode", json={"mode": "off"})
+            self.assertEqual(device.requests, ["POST led/mode"])
+
+    async def test_session_options(self):
+        client = Twinkly(host="127.0.0.1", limit_per_host=1, keepalive_timeout=1.5, dns_cache_ttl=60)
+        try:
+            connector = client._get_session().connector
+            self.assertEqual(connector.limit_per_host, 1)
+            self.assertEqual(connector._keepalive_timeout, 1.5)
+            self.assertTrue(connector.use_dns_cache)
+        finally:
+            await client.close()
+
+    async def test_connection_reuse(self):
+        async with twinkly_server() as (client, device):
+            for mode in ("off", "movie", "color"):
+                await client._post("led/mode", json={"mode": mode})
+            self.assertEqual(len(device.peers), 3)
+            self.assertEqual(len(set(device.peers)), 1)
+
+    async def test_reconnect_stale_connection(self):
+        async with twinkly_server() as (client, device):
+            await client._post("led/mode", json={"mode": "off"})
+            device.drop_pooled = 1
+            await client.set_mode("color")
+            self.assertEqual(device.mode, "color")
+            self.assertEqual(device.requests, ["POST led/mode"] * 3)
+            self.assertEqual(len(set(device.peers)), 2)
+
+    async def test_no_reconnect_unsafe(self):
+        async with twinkly_server() as (client, device):
+            await client._post("music/drivers/next", json={})
+            device.drop_pooled = 1
+            # The device may have acted on it, so it must not be sent again
+            with self.assertRaises(ServerDisconnectedError):
+                await client._post("music/drivers/next", json={})
+            self.assertEqual(device.requests, ["POST music/drivers/next"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from ttls.retry import NO_RETRY, TwinklyRetryPolicy
+
+
+class TestTwinklyRetryPolicy(unittest.TestCase):
+    def test_timeout(self):
+        policy = TwinklyRetryPolicy(first_timeout=3)
+        self.assertEqual(policy.timeout(0, 10), 3)
+        self.assertEqual(policy.timeout(1, 10), 10)
+        self.assertEqual(policy.timeout(0, 2), 2)
+        self.assertEqual(NO_RETRY.timeout(0, 10), 10)
+
+    def test_timeout_awake(self):
+        policy = TwinklyRetryPolicy(first_timeout=3, idle_after=10)
+        self.assertEqual(policy.timeout(0, 10, idle=None), 3)
+        self.assertEqual(policy.timeout(0, 10, idle=60), 3)
+        self.assertEqual(policy.timeout(0, 10, idle=1), 10)
+
+    def test_delay(self):
+        policy = TwinklyRetryPolicy(backoff=1, max_backoff=3, jitter=0.5)
+        for _ in range(100):
+            self.assertTrue(0.5 <= policy.delay(1) <= 1)
+            self.assertTrue(1 <= policy.delay(2) <= 2)
+            self.assertTrue(1.5 <= policy.delay(5) <= 3)
+        self.assertEqual(TwinklyRetryPolicy(backoff=1, jitter=0).delay(2), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import unittest
+
+import aiounittest
+from test_cli import run_cli
+from test_emulator import emulated
+
+from ttls.colours import TwinklyColour
+from ttls.scene import TwinklyScene
+from ttls.state import TwinklyState, TwinklyStateCache
+
+
+class TestTwinklyScene(unittest.TestCase):
+    def test_target_mode(self):
+        self.assertIsNone(TwinklyScene(brightness=10).target_mode)
+        self.assertEqual(TwinklyScene(colour=TwinklyColour(1, 2, 3)).target_mode, "color")
+        self.assertEqual(TwinklyScene(movie_id=1).target_mode, "movie")
+        self.assertEqual(TwinklyScene(mode="off", colour=TwinklyColour(1, 2, 3)).target_mode, "off")
+
+    def test_changes(self):
+        state = TwinklyState(mode="color", brightness=50, brightness_enabled=True, colour=TwinklyColour(1, 2, 3))
+        scene = TwinklyScene(brightness=50, colour=TwinklyColour(1, 2, 3))
+        self.assertEqual(scene.fields, ["colour", "brightness", "mode"])
+        self.assertEqual(scene.changes(state), [])
+        self.assertEqual(
+            TwinklyScene(brightness=60, colour=TwinklyColour(3, 2, 1)).changes(state), ["colour", "brightness"]
+        )
+        state.brightness_enabled = False
+        self.assertEqual(scene.changes(state), ["brightness"])
+        self.assertEqual(TwinklyScene(movie_id=2).changes(state), ["movie", "mode"])
+
+
+class TestApplyScene(aiounittest.AsyncTestCase):
+    async def test_apply(self):
+        scene = TwinklyScene(brightness=50, colour=TwinklyColour(10, 20, 30))
+        for api_version, order in ((1, ["colour", "brightness", "mode"]), (2, ["mode", "colour", "brightness"])):
+            async with emulated(api_version) as (client, emulator):
+                client._state = TwinklyStateCache(ttl=60)
+                result = await client.apply_scene(scene)
+                self.assertEqual(result.written, order)
+                self.assertEqual(result.skipped, [])
+                self.assertGreater(result.latency, 0)
+                self.assertEqual(emulator.mode, "color")
+                self.assertEqual(emulator.brightness["value"], 50)
+                self.assertEqual(emulator.colour, {"red": 10, "green": 20, "blue": 30})
+
+                # Nothing to do, and the cached state needs no requests
+                emulator.requests.clear()
+                result = await client.apply_scene(scene)
+                self.assertEqual(result.written, [])
+                self.assertEqual(result.skipped, ["colour", "brightness", "mode"])
+                self.assertEqual(result.requests, 0)
+                self.assertEqual(emulator.requests, [])
+
+    async def test_partial(self):
+        async with emulated(2) as (client, emulator):
+            await client.set_brightness(50)
+            emulator.requests.clear()
+            result = await client.apply_scene(TwinklyScene(mode="off", brightness=50))
+            self.assertEqual(result.written, ["mode"])
+            self.assertEqual(result.skipped, ["brightness"])
+            # The current state comes from the summary alone, the current movie is not needed
+            self.assertEqual(emulator.requests, ["GET summary", "POST application/mode"])
+
+    async def test_movie(self):
+        async with emulated(1) as (client, emulator):
+            emulator.movies = [{"id": 3, "unique_id": "A", "name": "a", "frames_number": 1}]
+            result = await client.apply_scene(TwinklyScene(movie_id=3))
+            self.assertEqual(result.written, ["movie"])
+            self.assertEqual(emulator.current_movie, 3)
+            result = await client.apply_scene(TwinklyScene(movie_id=3))
+            self.assertEqual(result.written, [])
+
+    async def test_cli(self):
+        async with emulated(1) as (_, emulator):
+            code, output = await run_cli("--host", emulator.address, "--json", "scene", "--colour", "1,2,3")
+        self.assertEqual(code, 0)
+        result = json.loads(output)
+        self.assertEqual(result["written"], ["colour", "mode"])
+        self.assertIn("latency", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import unittest
+from typing import Any
+
+import aiounittest
+
+from ttls.client import TWINKLY_RETURN_CODE, TWINKLY_RETURN_CODE_OK, Twinkly
+from ttls.colours import TwinklyColour
+from ttls.state import TwinklyState, TwinklyStateCache
+
+SUMMARY = {
+    "led_mode": {"mode": "movie", "shop_mode": 0, "id": 3, "unique_id": "ABC", "name": "xmas"},
+    "filters": [
+        {"filter": "brightness", "config": {"value": 60, "mode": "enabled"}},
+        {"filter": "hue", "config": {"value": 0, "mode": "disabled"}},
+    ],
+    "color": {"hue": 0, "saturation": 0, "value": 255, "red": 255, "green": 0, "blue": 0},
+    TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK,
+}
+
+
+class TwinklyStateMock(Twinkly):
+    def __init__(self, *args, summary: dict | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._details = {"number_of_led": 250}
+        self.requests = []
+        self.summary_response = summary or {TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+    async def _get(self, endpoint: str, **kwargs) -> Any:
+        self.requests.append(f"GET {endpoint}")
+        if endpoint == "summary":
+            return self.summary_response
+        if endpoint == "led/color":
+            return {"red": 0, "green": 0, "blue": 255, TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+        if endpoint == "led/mode":
+            return {"mode": "movie", TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+        if endpoint == "led/out/brightness":
+            return {"mode": "enabled", "value": 80, TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+    async def _post(self, endpoint: str, **kwargs) -> Any:
+        self.requests.append(f"POST {endpoint}")
+        return {TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}
+
+
+class TestTwinklyStateCache(aiounittest.AsyncTestCase):
+    def test_ttl(self):
+        cache = TwinklyStateCache(ttl=60, ttls={"mode": 0})
+        cache.set("mode", {"mode": "movie"})
+        cache.set("brightness", {"value": 10})
+        self.assertIsNone(cache.get("mode"))
+        self.assertEqual(cache.get("brightness"), {"value": 10})
+        self.assertEqual(cache.hits["brightness"], 1)
+        self.assertEqual(cache.misses["mode"], 1)
+        cache.invalidate()
+        self.assertIsNone(cache.get("brightness"))
+
+    async def test_read_through(self):
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1, state_cache=TwinklyStateCache())
+        self.assertEqual((await t.get_mode())["mode"], "movie")
+        self.assertTrue(await t.is_on())
+        self.assertEqual((await t.get_brightness())["value"], 80)
+        await t.get_brightness()
+        self.assertEqual(t.requests, ["GET led/mode", "GET led/out/brightness"])
+
+    async def test_write_through(self):
+        state = TwinklyStateCache()
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1, state_cache=state)
+        await t.turn_off()
+        await t.set_brightness(20)
+        await t.set_static_colour(TwinklyColour(1, 2, 3))
+        t.requests = []
+        self.assertEqual((await t.get_mode())["mode"], "color")
+        self.assertEqual((await t.get_brightness())["value"], 20)
+        self.assertEqual((await t.get_current_colour())["red"], 1)
+        self.assertEqual(t.requests, [])
+        self.assertEqual(state.misses, {})
+
+    async def test_expired(self):
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1, state_cache=TwinklyStateCache(ttl=0.01))
+        await t.get_mode()
+        await asyncio.sleep(0.02)
+        await t.get_mode()
+        self.assertEqual(t.requests, ["GET led/mode", "GET led/mode"])
+
+    async def test_disabled(self):
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1)
+        await t.get_mode()
+        await t.get_mode()
+        self.assertEqual(t.requests, ["GET led/mode", "GET led/mode"])
+
+
+class TestTwinklyRefreshState(aiounittest.AsyncTestCase):
+    def test_from_summary(self):
+        state = TwinklyState.from_summary(SUMMARY)
+        self.assertEqual(state.mode, "movie")
+        self.assertTrue(state.is_on)
+        self.assertEqual(state.brightness, 60)
+        self.assertTrue(state.brightness_enabled)
+        self.assertEqual(state.colour, TwinklyColour(255, 0, 0))
+        self.assertEqual(state.movie, {"id": 3, "unique_id": "ABC", "name": "xmas"})
+        self.assertIsNone(state.network)
+
+    async def test_single_request(self):
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1, summary=SUMMARY, state_cache=TwinklyStateCache())
+        state = await t.refresh_state()
+        self.assertEqual(state.brightness, 60)
+        self.assertEqual((await t.get_mode())["mode"], "movie")
+        self.assertEqual((await t.get_brightness())["value"], 60)
+        self.assertEqual((await t.get_current_colour())["red"], 255)
+        self.assertEqual(t.requests, ["GET summary"])
+
+    async def test_fallback(self):
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1)
+        state = await t.refresh_state()
+        self.assertEqual(state.mode, "movie")
+        self.assertEqual(state.brightness, 80)
+        self.assertEqual(state.colour, TwinklyColour(0, 0, 255))
+        self.assertEqual(
+            t.requests,
+            ["GET summary", "GET led/mode", "GET led/out/brightness", "GET led/color", "GET movies/current"],
+        )
+
+    async def test_fields(self):
+        t = TwinklyStateMock(host="192.0.2.1", api_version=1)
+        state = await t.refresh_state(fields=["brightness"])
+        self.assertEqual(state.brightness, 80)
+        self.assertIsNone(state.colour)
+        self.assertEqual(t.requests, ["GET summary", "GET led/out/brightness"])
+
+
+if __name__ == "__main__":
+    unittest.main()
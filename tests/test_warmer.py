@@ -0,0 +1,73 @@
+import asyncio
+import time
+import unittest
+
+import aiounittest
+
+from ttls.warmer import TwinklyWarmer
+
+
+class TwinklyInfoMock:
+    """Device whose radio sleeps after idle seconds without a request"""
+
+    def __init__(self, idle: float, warm: float = 0.001, cold: float = 0.05):
+        self.host = "mock"
+        self.idle = idle
+        self.warm = warm
+        self.cold = cold
+        self.pings = 0
+        self._last_request = None
+
+    async def _info(self, **kwargs):
+        self.pings += 1
+        now = time.monotonic()
+        asleep = self._last_request is not None and now - self._last_request > self.idle
+        await asyncio.sleep(self.cold if asleep else self.warm)
+        self._last_request = time.monotonic()
+        return {"code": 1000}
+
+
+class TestTwinklyWarmer(aiounittest.AsyncTestCase):
+    def test_adapt(self):
+        warmer = TwinklyWarmer(TwinklyInfoMock(idle=1), interval=10, min_interval=2, max_interval=40)
+        warmer._adapt(0.05)
+        self.assertEqual(warmer.interval, 12.5)
+        warmer._adapt(0.05)
+        self.assertEqual(warmer.interval, 15.625)
+        warmer._adapt(1.0)
+        self.assertEqual(warmer.slow_pings, 1)
+        self.assertEqual(warmer.interval, 15.625 / 2)
+        self.assertEqual(warmer.warm_latency, 0.05)
+        self.assertEqual(warmer.cold_latency, 1.0)
+        for _ in range(10):
+            warmer._adapt(0.05)
+        self.assertEqual(warmer.interval, 15.625 * 0.8)
+        for _ in range(10):
+            warmer._adapt(1.0)
+        self.assertEqual(warmer.interval, 2)
+
+    async def test_keeps_radio_awake(self):
+        device = TwinklyInfoMock(idle=0.05)
+        warmer = TwinklyWarmer(device, interval=0.02, min_interval=0.01, max_interval=0.2)
+        warmer.start()
+        await asyncio.sleep(0.5)
+        await warmer.stop()
+        self.assertFalse(warmer.running)
+        self.assertGreater(warmer.pings, 5)
+        # Probing beyond the idle timeout is allowed to cost a few slow pings
+        self.assertLess(warmer.slow_pings, warmer.pings / 2)
+        self.assertLess(warmer.interval, 0.05)
+
+    async def test_skips_ping_when_busy(self):
+        device = TwinklyInfoMock(idle=1)
+        warmer = TwinklyWarmer(device, interval=0.05)
+        warmer.start()
+        for _ in range(10):
+            device._last_request = time.monotonic()
+            await asyncio.sleep(0.01)
+        await warmer.stop()
+        self.assertEqual(device.pings, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
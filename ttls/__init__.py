@@ -1,3 +1,7 @@
-from importlib.metadata import version
+def __getattr__(name: str):
+    # Looking up package metadata is slow, so only do it when asked for
+    if name == "__version__":
+        from importlib.metadata import version
 
-__version__ = version("ttls")
+        return version("ttls")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,117 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "ttls",
+    "devices.json",
+)
+
+# Fields of an entry holding the authentication token, and describing the
+# device at the host; other fields, such as those of a registry, are kept
+# when these are invalidated
+TOKEN_FIELDS = ("token", "expires", "refresh_at")
+DEVICE_FIELDS = ("device_id", "api_version", "details", "default_mode", "movies", *TOKEN_FIELDS)
+
+
+def device_id(details: dict[str, Any]) -> str | None:
+    """Return a stable identifier for a device from its gestalt details"""
+    return details.get("uuid") or details.get("mac")
+
+
+class TwinklyCache:
+    """
+    On-disk cache of device state that survives between processes.
+
+    Entries are keyed by host and hold the API version, gestalt details,
+    default mode and authentication token with its expiry time, together with
+    the device identifier (UUID or MAC) they belong to. The file is rewritten
+    atomically and is only readable by the owner, as it contains tokens.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+
+    def _read(self) -> dict[str, dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            _LOGGER.warning("Ignoring unreadable cache %s: %s", self.path, e)
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write(self, data: dict[str, dict[str, Any]]) -> None:
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".devices.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            _LOGGER.warning("Failed to write cache %s: %s", self.path, e)
+
+    def entries(self) -> dict[str, dict[str, Any]]:
+        """Return all cached entries by host"""
+        return self._read()
+
+    def load(self, host: str) -> dict[str, Any]:
+        """Return cached entry for host"""
+        return self._read().get(host, {})
+
+    def store(self, host: str, **fields: Any) -> None:
+        """Update cached entry for host"""
+        data = self._read()
+        entry = data.setdefault(host, {})
+        entry.update(fields)
+        self._write(data)
+
+    def invalidate(self, host: str, *fields: str) -> None:
+        """Remove cached entry for host, or only the given fields of it"""
+        data = self._read()
+        if not fields:
+            if data.pop(host, None) is not None:
+                _LOGGER.debug("Invalidated cache for %s", host)
+                self._write(data)
+            return
+        entry = data.get(host, {})
+        removed = [field for field in fields if entry.pop(field, None) is not None]
+        if removed:
+            _LOGGER.debug("Invalidated %s in cache for %s", ", ".join(removed), host)
+            self._write(data)
@@ -27,43 +27,52 @@ IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import argparse
-import asyncio
+import dataclasses
 import json
 import logging
+import os
 import re
 import sys
+from typing import TYPE_CHECKING
 
-from .client import (
+from .cache import DEFAULT_CACHE_PATH, TwinklyCache
+from .colours import TwinklyColour
+from .const import (
+    DEFAULT_CONCURRENCY,
     TWINKLY_MODES,
     TWINKLY_MUSIC_DRIVERS,
     TWINKLY_MUSIC_DRIVERS_OFFICIAL,
     TWINKLY_MUSIC_DRIVERS_UNOFFICIAL,
-    Twinkly,
 )
-from .colours import TwinklyColour
+
+# The client and everything depending on aiohttp is only imported once a
+# command needs the network, to keep startup fast
+if TYPE_CHECKING:
+    from .client import Twinkly
+    from .group import TwinklyGroupResult
 
 logger = logging.getLogger(__name__)
 
 
-async def command_name(t: Twinkly, args: argparse.Namespace):
+async def command_name(t: "Twinkly", args: argparse.Namespace):
     if args.name is None:
         return await t.get_name()
     return await t.set_name(args.name)
 
 
-async def command_network(t: Twinkly, args: argparse.Namespace):
+async def command_network(t: "Twinkly", args: argparse.Namespace):
     return await t.get_network_status()
 
 
-async def command_firmware(t: Twinkly, args: argparse.Namespace):
+async def command_firmware(t: "Twinkly", args: argparse.Namespace):
     return await t.get_firmware_version()
 
 
-async def command_details(t: Twinkly, args: argparse.Namespace):
+async def command_details(t: "Twinkly", args: argparse.Namespace):
     return await t.get_details()
 
 
-async def command_power(t: Twinkly, args: argparse.Namespace):
+async def command_power(t: "Twinkly", args: argparse.Namespace):
     if args.on:
         return await t.turn_on()
     elif args.off:
@@ -76,62 +85,76 @@ async def command_power(t: Twinkly, args: argparse.Namespace):
             return "off"
 
 
-async def command_brightness(t: Twinkly, args: argparse.Namespace):
+async def command_brightness(t: "Twinkly", args: argparse.Namespace):
     if args.pct is None:
         return await t.get_brightness()
     return await t.set_brightness(args.pct)
 
 
-async def command_mode(t: Twinkly, args: argparse.Namespace):
+async def command_mode(t: "Twinkly", args: argparse.Namespace):
     if args.mode is None:
         return await t.get_mode()
     return await t.set_mode(args.mode)
 
 
-async def command_mqtt(t: Twinkly, args: argparse.Namespace):
+async def command_mqtt(t: "Twinkly", args: argparse.Namespace):
     if args.mqtt_json is None:
         return await t.get_mqtt()
     data = json.loads(args.mqtt_json)
     return await t.set_mqtt(data)
 
 
-async def command_movie(t: Twinkly, args: argparse.Namespace):
+async def command_movie(t: "Twinkly", args: argparse.Namespace):
+    from .movie import movie_frames
+
     if args.movie_file is None:
         return await t.get_movie_config()
-    with open(args.movie_file, "rb") as f:
-        movie = f.read()
     await t.interview()
     params = {
         "frame_delay": args.movie_delay,
         "leds_number": t.length,
-        "frames_number": int(len(movie) / 3 / t.length),
+        "frames_number": movie_frames(os.path.getsize(args.movie_file), t.length, t.bytes_per_led),
     }
     await t.set_mode("movie")
     await t.set_movie_config(params)
-    return await t.upload_movie(movie)
+    return await t.upload_movie(args.movie_file)
 
 
-async def command_static(t: Twinkly, args: argparse.Namespace):
-    await t.interview()
+def parse_colour(colour: str) -> TwinklyColour:
     # match on r,g,b, r,g,b,w or r,g,b,w,cw
-    if m := re.match(r"(\d+),(\d+),(\d+)(?:,(\d+)(?:,(\d+))?)?", args.colour):
+    if m := re.match(r"(\d+),(\d+),(\d+)(?:,(\d+)(?:,(\d+))?)?", colour):
         r = int(m.group(1))
         g = int(m.group(2))
         b = int(m.group(3))
         # w and cw are optional; convert to int if set
         w = int(m.group(4)) if m.group(4) is not None else None
         cw = int(m.group(5)) if m.group(5) is not None else None
-        c = TwinklyColour(r, g, b, w, cw)
-    else:
-        raise ValueError("Colour argument is not in r,g,b, r,g,b,w or r,g,b,w,cw format")
-    return await t.set_static_colour(c)
+        return TwinklyColour(r, g, b, w, cw)
+    raise ValueError("Colour argument is not in r,g,b, r,g,b,w or r,g,b,w,cw format")
+
+
+async def command_static(t: "Twinkly", args: argparse.Namespace):
+    await t.interview()
+    return await t.set_static_colour(parse_colour(args.colour))
+
+
+async def command_scene(t: "Twinkly", args: argparse.Namespace):
+    from .scene import TwinklyScene
+
+    scene = TwinklyScene(
+        mode=args.mode,
+        brightness=args.pct,
+        colour=parse_colour(args.colour) if args.colour else None,
+        movie_id=args.movie_id,
+    )
+    return dataclasses.asdict(await t.apply_scene(scene))
 
 
-async def command_summary(t: Twinkly, args: argparse.Namespace):
+async def command_summary(t: "Twinkly", args: argparse.Namespace):
     return await t.summary()
 
 
-async def command_music(t: Twinkly, args: argparse.Namespace):
+async def command_music(t: "Twinkly", args: argparse.Namespace):
     if args.on:
         return await t.music_on()
     elif args.off:
@@ -145,21 +168,95 @@ async def command_music(t: Twinkly, args: argparse.Namespace):
     elif args.driver:
         return await t.set_current_music_driver(args.driver)
     elif args.list:
-        if args.list == "all":
-            return TWINKLY_MUSIC_DRIVERS
-        elif args.list == "official":
-            return TWINKLY_MUSIC_DRIVERS_OFFICIAL
-        elif args.list == "unofficial":
-            return TWINKLY_MUSIC_DRIVERS_UNOFFICIAL
-
-
-async def main_loop() -> None:
-    """Main function"""
-
+        return music_drivers(args.list)
+
+
+def music_drivers(kind: str) -> dict[str, str]:
+    if kind == "official":
+        return TWINKLY_MUSIC_DRIVERS_OFFICIAL
+    elif kind == "unofficial":
+        return TWINKLY_MUSIC_DRIVERS_UNOFFICIAL
+    return TWINKLY_MUSIC_DRIVERS
+
+
+# Commands by name, for the daemon
+COMMANDS = {
+    "network": command_network,
+    "firmware": command_firmware,
+    "details": command_details,
+    "name": command_name,
+    "power": command_power,
+    "brightness": command_brightness,
+    "mode": command_mode,
+    "mqtt": command_mqtt,
+    "movie": command_movie,
+    "static": command_static,
+    "scene": command_scene,
+    "summary": command_summary,
+    "music": command_music,
+}
+
+# Options that apply to the CLI itself rather than to a command
+GLOBAL_OPTIONS = {"hosts", "hosts_file", "parallel", "fail_on", "debug", "json", "cache", "via_daemon", "func"}
+
+
+def read_hosts(filename: str) -> list[str]:
+    """Read hosts from file, one per line, ignoring blank lines and comments"""
+    with open(filename) as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def failed(results: dict[str, "TwinklyGroupResult"], fail_on: str) -> bool:
+    """Return whether results count as a failure"""
+    errors = sum(not result.ok for result in results.values())
+    if fail_on == "any":
+        return errors > 0
+    if fail_on == "all":
+        return errors == len(results)
+    return False
+
+
+def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Twinkly Twinkly Little Star")
-    parser.add_argument("--host", metavar="hostname", required=True, help="Device address")
+    parser.add_argument(
+        "--host",
+        dest="hosts",
+        metavar="hostname",
+        action="append",
+        default=[],
+        help="Device address, may be repeated",
+    )
+    parser.add_argument("--hosts-file", metavar="filename", help="File with device addresses, one per line")
+    parser.add_argument(
+        "--parallel",
+        metavar="n",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Number of devices operated on at the same time (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--fail-on",
+        choices=["any", "all", "none"],
+        default="any",
+        help="Exit with an error if any, all or none of the devices fail (default: any)",
+    )
+    parser.add_argument(
+        "--via-daemon",
+        metavar="socket",
+        nargs="?",
+        const="",
+        help="Send command to a running 'ttls serve' daemon (default: /tmp/ttls-<uid>/daemon.sock)",
+    )
     parser.add_argument("--debug", action="store_true", help="Enable debugging")
     parser.add_argument("--json", action="store_true", help="Output result as compact JSON")
+    parser.add_argument(
+        "--cache",
+        metavar="filename",
+        nargs="?",
+        const=DEFAULT_CACHE_PATH,
+        help=f"Cache device details and token between runs (default: {DEFAULT_CACHE_PATH})",
+    )
 
     subparsers = parser.add_subparsers(dest="command")
 
@@ -241,6 +338,16 @@ async def main_loop() -> None:
     )
     parser_colour.set_defaults(func=command_static)
 
+    parser_scene = subparsers.add_parser(
+        "scene",
+        help="Apply mode, brightness, colour and movie, only writing what differs from the current state",
+    )
+    parser_scene.add_argument("--mode", choices=TWINKLY_MODES, required=False)
+    parser_scene.add_argument("--brightness", dest="pct", metavar="value", type=int, help="Percent brightness (1-100)")
+    parser_scene.add_argument("--colour", metavar="colour", type=str, help="Colour as r,g,b, r,g,b,w or r,g,b,w,cw")
+    parser_scene.add_argument("--movie-id", metavar="id", type=int, help="Stored movie to play")
+    parser_scene.set_defaults(func=command_scene)
+
     parser_summary = subparsers.add_parser("summary", help="Get device summary")
     parser_summary.set_defaults(func=command_summary)
 
@@ -287,31 +394,142 @@ async def main_loop() -> None:
     )
     parser_music.set_defaults(func=command_music)
 
-    args = parser.parse_args()
-
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG)
+    parser_serve = subparsers.add_parser("serve", help="Keep devices warm and serve commands on a Unix socket")
+    parser_serve.add_argument(
+        "--socket",
+        metavar="path",
+        help="Control socket (default: /tmp/ttls-<uid>/daemon.sock)",
+    )
+    parser_serve.add_argument("--keep-warm", action="store_true", help="Keep device radios awake")
 
-    t = Twinkly(host=args.host)
+    return parser
 
-    try:
-        res = await args.func(t, args)
-    except AttributeError:
-        parser.print_help()
-        await t.close()
-        sys.exit(0)
 
+def print_result(res, args: argparse.Namespace) -> None:
     if args.json:
         print(json.dumps(res, indent=None, separators=(",", ":")))
     else:
         if res is not None:
             print(json.dumps(res, indent=4))
 
-    await t.close()
+
+def run_offline(args: argparse.Namespace) -> bool:
+    """Run command if it does not need a device, and return whether it did"""
+    if args.command != "music" or not args.list:
+        return False
+    if args.on or args.off or args.next or args.prev or args.current or args.driver:
+        return False
+    print_result(music_drivers(args.list), args)
+    return True
+
+
+async def main_loop(parser: argparse.ArgumentParser | None = None, args: argparse.Namespace | None = None) -> None:
+    """Main function"""
+
+    from .client import Twinkly
+    from .daemon import encode_results
+    from .group import TwinklyGroup
+
+    if parser is None:
+        parser = create_parser()
+    if args is None:
+        args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if run_offline(args):
+        return
+
+    hosts = list(args.hosts)
+    if args.hosts_file:
+        hosts.extend(read_hosts(args.hosts_file))
+    hosts = list(dict.fromkeys(hosts))
+    cache = TwinklyCache(args.cache) if args.cache else None
+
+    if args.command == "serve":
+        await serve(args, hosts, cache)
+        return
+
+    if not hosts:
+        parser.error("at least one --host or --hosts-file is required")
+
+    if not hasattr(args, "func"):
+        parser.print_help()
+        sys.exit(0)
+
+    if args.via_daemon is not None:
+        await via_daemon(args, hosts)
+        return
+
+    # A single device keeps the plain output, and raises on failure
+    if len(hosts) == 1:
+        t = Twinkly(host=hosts[0], cache=cache)
+        try:
+            print_result(await args.func(t, args), args)
+        finally:
+            await t.close()
+        return
+
+    async with TwinklyGroup(hosts, cache=cache, concurrency=args.parallel) as group:
+        results = await group.run(lambda t: args.func(t, args))
+
+    print_result(encode_results(results), args)
+    if failed(results, args.fail_on):
+        sys.exit(1)
+
+
+async def serve(args: argparse.Namespace, hosts: list[str], cache: TwinklyCache | None) -> None:
+    from .daemon import TwinklyDaemon
+
+    daemon = TwinklyDaemon(
+        COMMANDS,
+        hosts=hosts,
+        path=args.socket,
+        cache=cache,
+        concurrency=args.parallel,
+        keep_warm=args.keep_warm,
+    )
+    async with daemon:
+        await daemon.serve_forever()
+
+
+async def via_daemon(args: argparse.Namespace, hosts: list[str]) -> None:
+    from .daemon import TwinklyDaemonError, encode_results, request
+
+    command_args = {k: v for k, v in vars(args).items() if k not in GLOBAL_OPTIONS}
+    # The daemon may run in another directory
+    if command_args.get("movie_file"):
+        command_args["movie_file"] = os.path.abspath(command_args["movie_file"])
+    try:
+        results = await request(hosts, args.command, command_args, path=args.via_daemon or None)
+    except TwinklyDaemonError as e:
+        print(f"ttls: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if len(hosts) == 1:
+        result = results[hosts[0]]
+        if not result.ok:
+            print(f"ttls: {result.error}", file=sys.stderr)
+            sys.exit(1)
+        print_result(result.result, args)
+        return
+
+    print_result(encode_results(results), args)
+    if failed(results, args.fail_on):
+        sys.exit(1)
 
 
 def main() -> None:
-    asyncio.run(main_loop())
+    parser = create_parser()
+    args = parser.parse_args()
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+    # Help and offline commands finish without importing asyncio or aiohttp
+    if not run_offline(args):
+        import asyncio
+
+        asyncio.run(main_loop(parser, args))
 
 
 if __name__ == "__main__":
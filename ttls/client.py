@@ -26,78 +26,57 @@ OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
 IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import asyncio
 import base64
+import functools
 import logging
 import os
-import socket
 import time
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable, Iterable
 from itertools import cycle, islice
 from typing import Any
+from urllib.parse import urlsplit
 
 from aiohttp import (
+    ClientOSError,
     ClientResponseError,
     ClientSession,
     ClientTimeout,
     ServerDisconnectedError,
+    TCPConnector,
+    TraceConfig,
 )
 from aiohttp.web_exceptions import HTTPUnauthorized
 
+from .cache import DEVICE_FIELDS, TOKEN_FIELDS, TwinklyCache, device_id
 from .colours import TwinklyColour, TwinklyColourTuple
+from .const import (  # noqa: F401
+    TWINKLY_MODES,
+    TWINKLY_MUSIC_DRIVERS,
+    TWINKLY_MUSIC_DRIVERS_OFFICIAL,
+    TWINKLY_MUSIC_DRIVERS_UNOFFICIAL,
+)
+from .limiter import PRIORITY_HIGH, PRIORITY_NORMAL, TwinklyRequestLimiter
+from .movie import TwinklyMovie, TwinklyMovieSource, TwinklyMovieStream, TwinklyTransferProgress
+from .realtime import (  # noqa: F401
+    RT_PAYLOAD_MAX_LIGHTS,
+    RT_TOKEN_REFRESH_MARGIN,
+    TwinklyDatagramEndpoint,
+    TwinklyFrame,
+    TwinklyFrameEncoder,
+    TwinklyRealtimeSession,
+)
+from .retry import NO_RETRY, TwinklyRetryPolicy
+from .scene import TwinklyScene, TwinklySceneResult
+from .state import TwinklyState, TwinklyStateCache
+from .warmer import TwinklyWarmer
 
 _LOGGER = logging.getLogger(__name__)
 
-TwinklyFrame = list[TwinklyColourTuple]
 TwinklyResult = dict | None
 
 
-TWINKLY_MODES = [
-    "color",
-    "demo",
-    "effect",
-    "movie",
-    "off",
-    "playlist",
-    "rt",
-]
-RT_PAYLOAD_MAX_LIGHTS = 300
-
-TWINKLY_MUSIC_DRIVERS_OFFICIAL = {
-    "VU Meter": "00000000-0000-0000-0000-000000000001",
-    "Beat Hue": "00000000-0000-0000-0000-000000000002",
-    "Psychedelica": "00000000-0000-0000-0000-000000000003",
-    "Red Vertigo": "00000000-0000-0000-0000-000000000004",
-    "Dancing Bands": "00000000-0000-0000-0000-000000000005",
-    "Diamond Swirl": "00000000-0000-0000-0000-000000000006",
-    "Joyful Stripes": "00000000-0000-0000-0000-000000000007",
-    "Angel Fade": "00000000-0000-0000-0000-000000000008",
-    "Clockwork": "00000000-0000-0000-0000-000000000009",
-    "Sipario": "00000000-0000-0000-0000-00000000000A",
-    "Sunset": "00000000-0000-0000-0000-00000000000B",
-    "Elevator": "00000000-0000-0000-0000-00000000000C",
-}
-
-TWINKLY_MUSIC_DRIVERS_UNOFFICIAL = {
-    "VU Meter 2": "00000000-0000-0000-0000-000001000001",
-    "Beat Hue 2": "00000000-0000-0000-0000-000001000002",
-    "Psychedelica 2": "00000000-0000-0000-0000-000001000003",
-    "Sparkle": "00000000-0000-0000-0000-000001000005",
-    "Sparkle Hue": "00000000-0000-0000-0000-000001000006",
-    "Psycho Sparkle": "00000000-0000-0000-0000-000001000007",
-    "Psycho Hue": "00000000-0000-0000-0000-000001000008",
-    "Red Line": "00000000-0000-0000-0000-000001000009",
-    "Red Vertigo 2": "00000000-0000-0000-0000-000002000004",
-    "Dancing Bands 2": "00000000-0000-0000-0000-000002000005",
-    "Diamond Swirl 2": "00000000-0000-0000-0000-000002000006",
-    "Angel Fade 2": "00000000-0000-0000-0000-000002000008",
-    "Clockwork 2": "00000000-0000-0000-0000-000002000009",
-    "Sunset 2": "00000000-0000-0000-0000-00000200000B",
-}
-
-TWINKLY_MUSIC_DRIVERS = {
-    **TWINKLY_MUSIC_DRIVERS_OFFICIAL,
-    **TWINKLY_MUSIC_DRIVERS_UNOFFICIAL,
-}
+TWINKLY_API_VERSIONS = (1, 2)
 
 TWINKLY_RETURN_CODE = "code"
 TWINKLY_RETURN_CODE_OK = 1000
@@ -110,8 +89,52 @@ TWINKLY_RETURN_CODE_OK = 1000
 # later request in the same cycle answered in well under a second. Responses
 # over three seconds happen in normal use too: a get_current_movie() on a
 # device rendering a movie was observed answering in 5.003 seconds.
+# Idempotent requests to a device that has been idle therefore get a short
+# first attempt followed by retries with this timeout, see TwinklyRetryPolicy,
+# while other requests get a single attempt with this timeout.
 DEFAULT_TIMEOUT = 10
 
+# Transport errors worth retrying, as seen when the device radio wakes up
+TWINKLY_RETRY_ERRORS = (ServerDisconnectedError, TimeoutError)
+
+# Twinkly controllers handle parallel requests poorly, so keep the number of
+# connections per device low. Their HTTP server drops idle connections without
+# notice, so pooled connections are only kept for a short while, and a request
+# that fails on a pooled connection is sent again on a new one. Host names are
+# resolved once per DNS cache TTL instead of on every connect.
+DEFAULT_LIMIT_PER_HOST = 2
+DEFAULT_KEEPALIVE_TIMEOUT = 5
+DEFAULT_DNS_CACHE_TTL = 300
+
+# Errors from a pooled connection that the device had already closed
+TWINKLY_STALE_ERRORS = (ServerDisconnectedError, ClientOSError)
+
+# Refresh the authentication token this many seconds before it expires, so
+# that requests made close to expiry do not have to wait for a new login.
+DEFAULT_TOKEN_REFRESH_MARGIN = 60
+
+
+async def _on_connection_reuse(session: ClientSession, context: Any, params: Any) -> None:
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx["reused"] = True
+
+
+def twinkly_session(
+    limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+    keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl: int | None = DEFAULT_DNS_CACHE_TTL,
+) -> ClientSession:
+    """Create a ClientSession with connection pooling tuned for Twinkly devices"""
+    connector = TCPConnector(
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=dns_cache_ttl,
+    )
+    # Lets requests tell whether they were sent on a pooled connection
+    trace = TraceConfig()
+    trace.on_connection_reuseconn.append(_on_connection_reuse)
+    return ClientSession(connector=connector, trace_configs=[trace])
+
 
 class Twinkly:
     def __init__(
@@ -120,6 +143,15 @@ class Twinkly:
         session: ClientSession | None = None,
         timeout: int | None = None,
         api_version: int | None = None,
+        endpoint: TwinklyDatagramEndpoint | None = None,
+        token_refresh_margin: float = DEFAULT_TOKEN_REFRESH_MARGIN,
+        cache: TwinklyCache | None = None,
+        state_cache: TwinklyStateCache | None = None,
+        limiter: TwinklyRequestLimiter | None = None,
+        retry: TwinklyRetryPolicy | None = None,
+        limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int | None = DEFAULT_DNS_CACHE_TTL,
     ):
         self.host = host
         self._timeout = ClientTimeout(total=timeout or DEFAULT_TIMEOUT)
@@ -129,14 +161,38 @@ class Twinkly:
         else:
             self._session = None
             self._shared_session = False
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._session_options = {
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "dns_cache_ttl": dns_cache_ttl,
+        }
+        self._endpoint = endpoint
+        self._shared_endpoint = endpoint is not None
         self._headers: dict[str, str] = {}
+        # Realtime frames go to the device address, without any HTTP port
+        self._rt_host = urlsplit(f"http://{host}").hostname or host
         self._rt_port = 7777
+        self._rt_encoders: dict[int, TwinklyFrameEncoder] = {}
         self._expires = None
+        self._refresh_at = None
         self._token = None
+        self._token_refresh_margin = token_refresh_margin
+        self._refresh_task: asyncio.Task | None = None
+        self._cache = cache
         self._details: dict[str, str | int] = {}
+        self._details_stale = False
         self._default_mode = "movie"
+        self._movies: set[str] = set()
+        self._state = state_cache
         self._api_version = api_version
+        self._detect_task: asyncio.Task | None = None
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self.limiter = limiter or TwinklyRequestLimiter()
+        self.retry = retry or TwinklyRetryPolicy()
+        self._last_request: float | None = None
+        self._warmer: TwinklyWarmer | None = None
+        if cache is not None:
+            self._load_cache()
 
     @property
     def base(self) -> str:
@@ -148,6 +204,13 @@ class Twinkly:
     def length(self) -> int:
         return int(self._details["number_of_led"])
 
+    @property
+    def bytes_per_led(self) -> int:
+        if "bytes_per_led" in self._details:
+            return int(self._details["bytes_per_led"])
+        profile = self._details.get("led_profile") or self._details.get("device_config", {}).get("led_profile")
+        return len(profile) if profile else 3
+
     def is_rgbw(self) -> bool:
         return self._details["led_profile"] == "RGBW"
 
@@ -169,117 +232,273 @@ class Twinkly:
         self._default_mode = mode
 
     async def close(self) -> None:
+        if self._warmer is not None:
+            await self._warmer.stop()
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+        if self._endpoint is not None and not self._shared_endpoint:
+            self._endpoint.close()
+            self._endpoint = None
         if not self._shared_session:
             await self._get_session().close()
             self._session = None
 
     async def interview(self, force: bool | None = False) -> None:
-        if len(self._details) == 0 or force:
+        if len(self._details) == 0 or force or self._details_stale:
             self._details = await self.get_details()
+            self._details_stale = False
             mode = await self.get_mode()
             if mode.get("mode") != "off":
                 self.default_mode = mode.get("mode")
+            if self._cache is not None:
+                self._store_details()
+
+    def _load_cache(self) -> None:
+        entry = self._cache.load(self.host)
+        if self._api_version is None:
+            self._api_version = entry.get("api_version")
+        if entry.get("details"):
+            self._details = entry["details"]
+        if entry.get("default_mode"):
+            self._default_mode = entry["default_mode"]
+        self._movies = set(entry.get("movies", []))
+        if entry.get("token") and entry.get("expires", 0) > time.time():
+            self._token = entry["token"]
+            self._headers["X-Auth-Token"] = self._token
+            self._expires = entry["expires"]
+            self._refresh_at = entry["refresh_at"]
+            _LOGGER.debug("Using cached authentication token")
+
+    def _store_details(self) -> None:
+        cached_id = self._cache.load(self.host).get("device_id")
+        current_id = device_id(self._details)
+        if cached_id is not None and cached_id != current_id:
+            _LOGGER.debug("Device at %s changed from %s to %s", self.host, cached_id, current_id)
+            self._cache.invalidate(self.host, *DEVICE_FIELDS)
+        self._cache.store(
+            self.host,
+            device_id=current_id,
+            api_version=self._api_version,
+            details=self._details,
+            default_mode=self._default_mode,
+        )
 
     def _get_session(self):
         if not self._session:
-            self._session = ClientSession()
+            self._session = twinkly_session(**self._session_options)
         return self._session
 
-    async def _info(self) -> Any:
+    async def _info(self, retry: TwinklyRetryPolicy | None = None, priority: int = PRIORITY_NORMAL) -> Any:
         _LOGGER.debug("INFO")
-        try:
-            async with self._get_session().get(
-                f"http://{self.host}/xled/info",
-                timeout=self._timeout,
-                raise_for_status=True,
-            ) as r:
-                _LOGGER.debug("INFO response %d", r.status)
-                return await r.json()
-        except (ClientResponseError, ServerDisconnectedError) as e:
-            raise e
+        return await self._retry(self._send, retry, "GET", f"http://{self.host}/xled/info", priority=priority)
+
+    def keep_warm(self, **kwargs) -> TwinklyWarmer:
+        """Start keeping the device radio awake, see TwinklyWarmer for arguments"""
+        if self._warmer is None:
+            self._warmer = TwinklyWarmer(self, **kwargs)
+        self._warmer.start()
+        return self._warmer
+
+    async def warm(self) -> float:
+        """Wake the device radio ahead of an operation, and return the latency"""
+        if self._warmer is None:
+            self._warmer = TwinklyWarmer(self)
+        return await self._warmer.warm()
+
+    async def _retry(
+        self,
+        request: Callable[..., Awaitable[Any]],
+        retry: TwinklyRetryPolicy | None,
+        *args,
+        **kwargs,
+    ) -> Any:
+        """Call request with a timeout per attempt, retrying transient transport errors"""
+        policy = retry or self.retry
+        attempt = 0
+        while True:
+            idle = time.monotonic() - self._last_request if self._last_request is not None else None
+            timeout = ClientTimeout(total=policy.timeout(attempt, self._timeout.total, idle))
+            try:
+                return await request(*args, timeout=timeout, **kwargs)
+            except TWINKLY_RETRY_ERRORS as e:
+                attempt += 1
+                if attempt >= policy.attempts:
+                    raise e
+                delay = policy.delay(attempt)
+                _LOGGER.debug("Request failed (%r), retry %d of %d in %.2fs", e, attempt, policy.attempts - 1, delay)
+                await asyncio.sleep(delay)
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        priority: int = PRIORITY_NORMAL,
+        idempotent: bool | None = None,
+        **kwargs,
+    ) -> Any:
+        if idempotent is None:
+            idempotent = method == "GET"
+        async with self.limiter.slot(priority):
+            # Every pooled connection may be stale, after which a new one is
+            # made; unless the request is safe to repeat, as the device may
+            # have acted on it before dropping the connection
+            for reconnect in range(self._session_options["limit_per_host"], -1, -1):
+                trace = {}
+                try:
+                    async with self._get_session().request(
+                        method, url, raise_for_status=True, trace_request_ctx=trace, **kwargs
+                    ) as r:
+                        _LOGGER.debug("%s response %d", method, r.status)
+                        self._last_request = time.monotonic()
+                        return await r.json()
+                except TWINKLY_STALE_ERRORS as e:
+                    if not trace.get("reused") or not reconnect or not idempotent:
+                        raise e
+                    _LOGGER.debug("Pooled connection to %s was closed (%r), reconnecting", self.host, e)
 
     async def get_api_version(self) -> int:
         if self._api_version is None:
-            self._api_version = await self.detect_api_version()
+            # Concurrent first callers share a single detection
+            if self._detect_task is None or self._detect_task.done():
+                self._detect_task = asyncio.create_task(self.detect_api_version())
+            self._api_version = await asyncio.shield(self._detect_task)
+            if self._cache is not None and self._api_version is not None:
+                self._cache.store(self.host, api_version=self._api_version)
         return self._api_version
 
     async def detect_api_version(self) -> int:
+        """Probe all API versions concurrently, the first valid answer wins"""
+        probes = {asyncio.create_task(self._probe_api_version(version)): version for version in TWINKLY_API_VERSIONS}
+        pending = set(probes)
+        errors = []
         try:
-            self._api_version = 1
-            _ = await self.get_details()
-            return 1
-        except (ClientResponseError, TwinklyError):
-            pass
-
-        try:
-            self._api_version = 2
-            _ = await self.get_details()
-            return 2
-        except (ClientResponseError, TwinklyError):
-            pass
-
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        task.result()
+                    except (ClientResponseError, TwinklyError):
+                        continue
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    _LOGGER.debug("Detected API version %d", probes[task])
+                    self._api_version = probes[task]
+                    return self._api_version
+        finally:
+            for task in probes:
+                task.cancel()
+                # A losing probe may fail after the winner answered
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        if errors:
+            raise errors[0]
         self._api_version = None
         return None
 
+    async def _probe_api_version(self, version: int) -> Any:
+        # Probes bypass the request limiter, as racing them is the point
+        async with self._get_session().get(
+            f"http://{self.host}/xled/v{version}/gestalt",
+            timeout=self._timeout,
+            raise_for_status=True,
+        ) as r:
+            _LOGGER.debug("GET v%d gestalt response %d", version, r.status)
+            return self._valid_response(await r.json(), api_version=version)
+
     async def _post(self, endpoint: str, require_token: bool = True, **kwargs) -> Any:
-        await self.get_api_version()
-        if require_token:
-            await self.ensure_token()
-        _LOGGER.debug("POST endpoint %s", endpoint)
         if "json" in kwargs:
             _LOGGER.debug("POST payload %s", kwargs["json"])
-        headers = kwargs.pop("headers", self._headers)
-        retry_num = kwargs.pop("retry_num", 0)
-        try:
-            async with self._get_session().post(
-                f"{self.base}/{endpoint}",
-                headers=headers,
-                timeout=self._timeout,
-                raise_for_status=True,
-                **kwargs,
-            ) as r:
-                _LOGGER.debug("POST response %d", r.status)
-                return await r.json()
-        except ClientResponseError as e:
-            if e.status == HTTPUnauthorized.status_code:
-                await self._handle_authorized(self._post, endpoint, exception=e, retry_num=retry_num, **kwargs)
-            else:
-                raise e
+        # GETs sent after a write must not share a response read before it
+        self._inflight.clear()
+        return await self._request("POST", endpoint, require_token=require_token, **kwargs)
 
     async def _get(self, endpoint: str, require_token: bool = True, **kwargs) -> Any:
+        if kwargs.keys() - {"params"}:
+            return await self._request("GET", endpoint, require_token=require_token, **kwargs)
+        # Identical GETs already in flight share a single request
+        key = (endpoint, require_token, tuple(sorted((kwargs.get("params") or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request("GET", endpoint, require_token=require_token, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight_done(key, t))
+        else:
+            _LOGGER.debug("GET endpoint %s already in flight", endpoint)
+        return await asyncio.shield(task)
+
+    def _inflight_done(self, key: tuple, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark exception as retrieved in case every caller was cancelled
+            task.exception()
+
+    async def _delete(self, endpoint: str, require_token: bool = True, **kwargs) -> Any:
+        self._inflight.clear()
+        return await self._request("DELETE", endpoint, require_token=require_token, **kwargs)
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        require_token: bool = True,
+        retry: TwinklyRetryPolicy | None = None,
+        idempotent: bool | None = None,
+        **kwargs,
+    ) -> Any:
         await self.get_api_version()
         if require_token:
             await self.ensure_token()
-        _LOGGER.debug("GET endpoint %s", endpoint)
-        headers = kwargs.pop("headers", self._headers)
+        _LOGGER.debug("%s endpoint %s", method, endpoint)
+        # Request headers are sent along with the authentication header
+        headers = kwargs.pop("headers", None)
         retry_num = kwargs.pop("retry_num", 0)
+        # Only requests that are safe to repeat are retried
+        if idempotent is None:
+            idempotent = method == "GET"
+        if not idempotent:
+            retry = NO_RETRY
+        token = self._token
         try:
-            async with self._get_session().get(
+            return await self._retry(
+                self._send,
+                retry,
+                method,
                 f"{self.base}/{endpoint}",
-                headers=headers,
-                timeout=self._timeout,
-                raise_for_status=True,
+                idempotent=idempotent,
+                headers={**self._headers, **(headers or {})},
                 **kwargs,
-            ) as r:
-                _LOGGER.debug("GET response %d", r.status)
-                return await r.json()
+            )
         except ClientResponseError as e:
             if e.status == HTTPUnauthorized.status_code:
                 return await self._handle_authorized(
-                    self._get,
+                    functools.partial(self._request, method),
                     endpoint,
                     exception=e,
+                    token=token,
                     retry_num=retry_num,
+                    require_token=require_token,
+                    retry=retry,
+                    idempotent=idempotent,
+                    headers=headers,
                     **kwargs,
                 )
             else:
                 raise e
 
-    async def _handle_authorized(self, request_method: Callable, endpoint: str, exception: Exception, **kwargs) -> None:
+    async def _handle_authorized(
+        self,
+        request_method: Callable,
+        endpoint: str,
+        exception: Exception,
+        token: str | None = None,
+        **kwargs,
+    ) -> None:
         max_retries = 1
         retry_num = kwargs.pop("retry_num", 0)
 
-        if retry_num >= max_retries:
+        if retry_num >= max_retries or asyncio.current_task() is self._refresh_task:
             _LOGGER.debug(f"Invalid token for request. Maximum retries of {max_retries} exceeded.")
             raise exception
 
@@ -287,18 +506,46 @@ class Twinkly:
         _LOGGER.debug(
             "Invalid token for request. " + f"Refreshing token and attempting retry {retry_num} of {max_retries}."
         )
-        await self.refresh_token()
-        return await request_method(endpoint, headers=self._headers, retry_num=retry_num, **kwargs)
+        if self._cache is not None:
+            self._cache.invalidate(self.host, *TOKEN_FIELDS)
+        # The device may have been replaced by another one at the same address
+        self._details_stale = True
+        # Only refresh if no other request has done so since this one was sent
+        if token == self._token:
+            await self.refresh_token()
+        return await request_method(endpoint, retry_num=retry_num, **kwargs)
 
     async def refresh_token(self) -> None:
+        """Log in again, sharing a single login between concurrent callers"""
+        await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_token())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return self._refresh_task
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        # Callers waiting for the login get the error, a background one only logs it
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.debug("Failed to refresh authentication token: %r", task.exception())
+
+    async def _refresh_token(self) -> None:
         await self.login()
         await self.verify_login()
         _LOGGER.debug("Authentication token refreshed")
+        if self._cache is not None:
+            self._cache.store(self.host, token=self._token, expires=self._expires, refresh_at=self._refresh_at)
 
     async def ensure_token(self) -> str:
-        if self._expires is None or self._expires <= time.time():
+        now = time.time()
+        if self._refresh_at is None or self._expires is None or self._expires <= now:
             _LOGGER.debug("Authentication token expired, will refresh")
             await self.refresh_token()
+        elif self._refresh_at <= now:
+            # Still valid, so requests go on with it while a new one is fetched
+            _LOGGER.debug("Authentication token about to expire, refreshing in the background")
+            self._start_refresh()
         else:
             _LOGGER.debug("Authentication token still valid")
         return self._token or ""
@@ -306,23 +553,25 @@ class Twinkly:
     async def login(self) -> None:
         challenge = base64.b64encode(os.urandom(32)).decode()
         payload = {"challenge": challenge}
-        async with self._get_session().post(
-            f"{self.base}/login",
-            json=payload,
-            timeout=self._timeout,
-            raise_for_status=True,
-        ) as r:
-            data = await r.json()
+        # A repeated login only yields a new token, so it is safe to retry
+        data = await self._retry(
+            self._send, None, "POST", f"{self.base}/login", json=payload, priority=PRIORITY_HIGH, idempotent=True
+        )
         self._token = data["authentication_token"]
         self._headers["X-Auth-Token"] = self._token
-        self._expires = time.time() + data["authentication_token_expires_in"]
+        expires_in = data["authentication_token_expires_in"]
+        self._expires = time.time() + expires_in
+        self._refresh_at = self._expires - min(self._token_refresh_margin, expires_in / 2)
 
     async def logout(self) -> None:
         await self._post("logout", json={})
         self._token = None
+        self._refresh_at = None
+        if self._cache is not None:
+            self._cache.store(self.host, token=None)
 
     async def verify_login(self) -> None:
-        await self._post("verify", json={})
+        await self._post("verify", json={}, require_token=False, priority=PRIORITY_HIGH, idempotent=True)
 
     async def get_name(self) -> Any:
         endpoint = "device_name" if await self.get_api_version() == 1 else "device/name"
@@ -330,9 +579,11 @@ class Twinkly:
 
     async def set_name(self, name: str) -> Any:
         endpoint = "device_name" if await self.get_api_version() == 1 else "device/name"
-        return await self._post(endpoint, json={"name": name})
+        return await self._post(endpoint, json={"name": name}, idempotent=True)
 
     async def reset(self) -> Any:
+        if self._state is not None:
+            self._state.invalidate()
         return self._valid_response(await self._get("reset"))
 
     async def get_network_status(self) -> Any:
@@ -359,64 +610,70 @@ class Twinkly:
         return await self.set_mode("off")
 
     async def get_brightness(self) -> Any:
-        return self._valid_response(await self._get("led/out/brightness"))
+        return await self._get_state(
+            "brightness",
+            lambda: self._get("led/out/brightness"),
+        )
 
     async def set_brightness(self, percent: int) -> Any:
         args = {"value": percent, "type": "A"}
         if await self.get_api_version() >= 2:
             args["mode"] = "enabled"
-        return await self._post("led/out/brightness", json=args)
+        response = await self._post("led/out/brightness", json=args, idempotent=True)
+        self._set_state("brightness", {"mode": "enabled", "value": percent}, response)
+        return response
 
     async def get_mode(self) -> Any:
         endpoint = "led/mode" if await self.get_api_version() == 1 else "application/mode"
-        return self._valid_response(await self._get(endpoint))
+        return await self._get_state("mode", lambda: self._get(endpoint))
 
     async def set_mode(self, mode: str) -> Any:
         endpoint = "led/mode" if await self.get_api_version() == 1 else "application/mode"
-        return await self._post(endpoint, json={"mode": mode})
+        response = await self._post(endpoint, json={"mode": mode}, idempotent=True)
+        self._set_state("mode", {"mode": mode}, response)
+        return response
 
     async def get_mqtt(self) -> Any:
         return self._valid_response(await self._get("mqtt/config"))
 
     async def set_mqtt(self, data: dict) -> Any:
-        return await self._post("mqtt/config", json=data)
+        return await self._post("mqtt/config", json=data, idempotent=True)
 
-    async def send_frame(self, frame: TwinklyFrame) -> None:
-        await self.interview()
-        if len(frame) != self.length:
-            raise ValueError("Invalid frame length")
-        token = await self.ensure_token()
-        header = bytes([0x01]) + bytes(base64.b64decode(token)) + bytes([self.length])
-        payload = []
-        for x in frame:
-            payload.extend(list(x))
-        self._socket.sendto(header + bytes(payload), (self.host, self._rt_port))
-
-    async def send_frame_2(self, frame: TwinklyFrame) -> None:
-        await self.interview()
-        if len(frame) != self.length:
-            raise ValueError("Invalid frame length")
-        token = await self.ensure_token()
-        frame_segments = [frame[i : i + RT_PAYLOAD_MAX_LIGHTS] for i in range(0, len(frame), RT_PAYLOAD_MAX_LIGHTS)]
-        for i in range(0, len(frame_segments)):
-            header = bytes([len(frame_segments)]) + bytes(base64.b64decode(token)) + bytes([0, 0]) + bytes([i])
-            payload = []
-            for x in frame_segments[i]:
-                payload.extend(list(x))
-            self._socket.sendto(header + bytes(payload), (self.host, self._rt_port))
-
-    async def send_frame_3(self, frame: TwinklyFrame) -> None:
+    async def send_frame(self, frame: TwinklyFrame | bytes | bytearray | memoryview) -> None:
+        await self._send_frame(frame, version=1)
+
+    async def send_frame_2(self, frame: TwinklyFrame | bytes | bytearray | memoryview) -> None:
+        await self._send_frame(frame, version=2)
+
+    async def send_frame_3(self, frame: TwinklyFrame | bytes | bytearray | memoryview) -> None:
+        await self._send_frame(frame, version=3)
+
+    async def _send_frame(self, frame: TwinklyFrame | bytes | bytearray | memoryview, version: int) -> None:
         await self.interview()
-        if len(frame) != self.length:
-            raise ValueError("Invalid frame length")
-        token = await self.ensure_token()
-        frame_segments = [frame[i : i + RT_PAYLOAD_MAX_LIGHTS] for i in range(0, len(frame), RT_PAYLOAD_MAX_LIGHTS)]
-        for i in range(0, len(frame_segments)):
-            header = bytes([0x03]) + bytes(base64.b64decode(token)) + bytes([0, 0]) + bytes([i])
-            payload = []
-            for x in frame_segments[i]:
-                payload.extend(list(x))
-            self._socket.sendto(header + bytes(payload), (self.host, self._rt_port))
+        encoder = self._get_frame_encoder(version)
+        encoder.set_token(await self.ensure_token())
+        endpoint = await self._get_endpoint()
+        address = await endpoint.resolve(self._rt_host, self._rt_port)
+        for datagram in encoder.encode(frame):
+            endpoint.sendto(datagram, address)
+        await endpoint.drain()
+
+    def realtime(self, version: int = 1, refresh_margin: float = RT_TOKEN_REFRESH_MARGIN) -> TwinklyRealtimeSession:
+        """Realtime session sending frames using the given protocol version"""
+        return TwinklyRealtimeSession(self, version=version, refresh_margin=refresh_margin)
+
+    async def _get_endpoint(self) -> TwinklyDatagramEndpoint:
+        if self._endpoint is None:
+            self._endpoint = TwinklyDatagramEndpoint()
+        await self._endpoint.open()
+        return self._endpoint
+
+    def _get_frame_encoder(self, version: int) -> TwinklyFrameEncoder:
+        encoder = self._rt_encoders.get(version)
+        if encoder is None or encoder.length != self.length or encoder.bytes_per_led != self.bytes_per_led:
+            encoder = TwinklyFrameEncoder(self.length, version, self.bytes_per_led)
+            self._rt_encoders[version] = encoder
+        return encoder
 
     async def get_movie_config(self) -> Any:
         if await self.get_api_version() != 1:
@@ -424,37 +681,53 @@ class Twinkly:
         return self._valid_response(await self._get("led/movie/config"))
 
     async def set_movie_config(self, data: dict) -> Any:
-        return await self._post("led/movie/config", json=data)
+        return await self._post("led/movie/config", json=data, idempotent=True)
 
-    async def upload_movie(self, movie: bytes) -> Any:
-        return await self._post(
-            "led/movie/full",
-            data=movie,
-            headers={"Content-Type": "application/octet-stream"},
-        )
+    async def upload_movie(
+        self,
+        movie: TwinklyMovieSource,
+        progress: Callable[[TwinklyTransferProgress], Any] | None = None,
+        size: int | None = None,
+    ) -> Any:
+        """
+        Upload movie from bytes, a file path, a file object or an async iterator of bytes.
+
+        The size in bytes must be given for sources of unknown size, such as
+        async iterators, as the firmware is not known to accept chunked uploads.
+        """
+        headers = {"Content-Type": "application/octet-stream"}
+        if isinstance(movie, bytes) and progress is None:
+            return await self._post("led/movie/full", data=movie, headers=headers)
+        stream = TwinklyMovieStream(movie, progress=progress, size=size)
+        if stream.size is None:
+            raise ValueError("Movie size must be given for a source of unknown size")
+        headers["Content-Length"] = str(stream.size)
+        return await self._post("led/movie/full", data=stream, headers=headers)
 
     async def set_static_colour(
         self,
         colour: TwinklyColour | TwinklyColourTuple | list[TwinklyColour] | list[TwinklyColourTuple],
     ) -> None:
-        if not self._details:
-            await self.interview()
+        await self.interview()
         if isinstance(colour, list):
             colour = colour[0]
         if isinstance(colour, tuple):
             colour = TwinklyColour.from_twinkly_tuple(colour)
         if await self.get_api_version() == 1:
-            await self._post(
-                "led/color",
-                json=colour.as_dict(),
-            )
+            await self._set_colour(colour)
             await self.set_mode("color")
         else:
             await self.set_mode("color")
-            await self._post(
-                "led/color",
-                json=colour.as_dict(),
-            )
+            await self._set_colour(colour)
+
+    async def _set_colour(self, colour: TwinklyColour) -> Any:
+        response = await self._post(
+            "led/color",
+            json=colour.as_dict(),
+            idempotent=True,
+        )
+        self._set_state("colour", colour.as_dict(), response)
+        return response
 
     async def set_cycle_colours(
         self,
@@ -469,26 +742,121 @@ class Twinkly:
         else:
             raise TypeError("Unknown colour format")
         frame = list(islice(cycle(sequence), self.length))
-        movie = bytes([item for t in frame for item in t])
-        await self.upload_movie(movie)
-        await self.set_movie_config(
-            {
-                "frames_number": 1,
-                "loop_type": 0,
-                "frame_delay": 1000,
-                "leds_number": self.length,
-            }
-        )
+        await self.set_movie(TwinklyMovie.from_frames([frame], frame_delay=1000))
+
+    async def set_movie(self, movie: TwinklyMovie) -> None:
+        """Upload and configure movie, and switch to movie mode"""
+        await self.upload_movie(movie.data)
+        await self.set_movie_config(movie.config)
         await self.set_mode("movie")
 
     async def summary(self) -> Any:
         return self._valid_response(await self._get("summary"))
 
+    async def refresh_state(self, network: bool = False, fields: Iterable[str] | None = None) -> TwinklyState:
+        """
+        Poll device state with a single summary request.
+
+        Fields missing from the summary, or all fields if the firmware has no
+        summary, are fetched with their individual requests; only those of
+        mode, brightness, colour and movie listed in fields, if given. The
+        network status is only fetched separately if asked for. The state
+        cache, if any, is updated with the result.
+        """
+        fields = set(fields) if fields is not None else {"mode", "brightness", "colour", "movie"}
+        try:
+            state = TwinklyState.from_summary(await self.summary())
+        except (ClientResponseError, TwinklyError) as e:
+            _LOGGER.debug("Summary not available: %s", e)
+            state = TwinklyState()
+
+        if state.mode is None and "mode" in fields:
+            state.mode = (await self.get_mode()).get("mode")
+        elif state.mode is not None:
+            self._cache_state("mode", {"mode": state.mode})
+        if state.brightness is None and "brightness" in fields:
+            brightness = await self.get_brightness()
+            state.brightness = brightness.get("value")
+            state.brightness_enabled = brightness.get("mode") == "enabled"
+        elif state.brightness is not None:
+            mode = "enabled" if state.brightness_enabled else "disabled"
+            self._cache_state("brightness", {"mode": mode, "value": state.brightness})
+        if state.colour is None and "colour" in fields:
+            try:
+                state.colour = TwinklyColour.from_dict(await self.get_current_colour())
+            except (ClientResponseError, TwinklyError, KeyError) as e:
+                _LOGGER.debug("Colour not available: %s", e)
+        elif state.colour is not None:
+            self._cache_state("colour", state.colour.as_dict())
+        if state.movie is None and state.mode == "movie" and "movie" in fields:
+            try:
+                state.movie = await self.get_current_movie()
+            except (ClientResponseError, TwinklyError) as e:
+                _LOGGER.debug("Current movie not available: %s", e)
+        if state.network is None and network:
+            try:
+                state.network = await self.get_network_status()
+            except (ClientResponseError, TwinklyError) as e:
+                _LOGGER.debug("Network status not available: %s", e)
+        return state
+
+    async def apply_scene(self, scene: TwinklyScene) -> TwinklySceneResult:
+        """
+        Apply scene, only writing the fields that differ from the current state.
+
+        The current state is taken from the state cache if it holds every field
+        the scene sets, and polled with refresh_state() otherwise, fetching no
+        more than the summary and the fields the scene sets. The writes
+        are sent back to back over the kept-alive connection, with the mode and
+        colour in the order the firmware expects, as in set_static_colour().
+        """
+        start = time.monotonic()
+        requests = self.limiter.requests
+        state = self._cached_state(scene) or await self.refresh_state(fields=scene.fields)
+        changes = scene.changes(state)
+        if "colour" in changes and "mode" in changes and await self.get_api_version() >= 2:
+            changes.remove("mode")
+            changes.insert(0, "mode")
+        writes = {
+            "colour": lambda: self._set_colour(scene.colour),
+            "movie": lambda: self.set_current_movie(scene.movie_id),
+            "brightness": lambda: self.set_brightness(scene.brightness),
+            "mode": lambda: self.set_mode(scene.target_mode),
+        }
+        for change in changes:
+            self._valid_response(await writes[change]())
+        return TwinklySceneResult(
+            written=changes,
+            skipped=[f for f in scene.fields if f not in changes],
+            requests=self.limiter.requests - requests,
+            latency=time.monotonic() - start,
+        )
+
+    def _cached_state(self, scene: TwinklyScene) -> TwinklyState | None:
+        """Return state of the fields set by scene from the state cache, if all are fresh"""
+        if self._state is None or scene.movie_id is not None:
+            return None
+        state = TwinklyState()
+        if scene.target_mode is not None:
+            if (mode := self._state.get("mode")) is None:
+                return None
+            state.mode = mode.get("mode")
+        if scene.brightness is not None:
+            if (brightness := self._state.get("brightness")) is None:
+                return None
+            state.brightness = brightness.get("value")
+            state.brightness_enabled = brightness.get("mode") == "enabled"
+        if scene.colour is not None:
+            if (colour := self._state.get("colour")) is None:
+                return None
+            state.colour = TwinklyColour.from_dict(colour)
+        return state
+
     async def music_on(self) -> Any:
-        return await self._post("music/enabled", json={"enabled": 1})
+        return await self._post("music/enabled", json={"enabled": 1}, idempotent=True)
 
     async def music_off(self) -> Any:
-        return await self._post("music/enabled", json={"enabled": 0})
+        return await self._post("music/enabled", json={"enabled": 0}, idempotent=True)
 
     async def get_music_drivers(self) -> Any:
         """
@@ -522,7 +890,7 @@ class Twinkly:
         current_driver = await self.get_current_music_driver()
         if current_driver["handle"] == -1:
             await self.next_music_driver()
-        return await self._post("music/drivers/current", json={"unique_id": unique_id})
+        return await self._post("music/drivers/current", json={"unique_id": unique_id}, idempotent=True)
 
     def _music_driver_id(self, driver_name: str) -> Any:
         if driver_name in TWINKLY_MUSIC_DRIVERS_OFFICIAL:
@@ -540,10 +908,109 @@ class Twinkly:
         return self._valid_response(await self._get("movies/current"))
 
     async def set_current_movie(self, movie_id: int) -> Any:
-        return await self._post("movies/current", json={"id": movie_id})
+        return await self._post("movies/current", json={"id": movie_id}, idempotent=True)
+
+    async def delete_movies(self) -> Any:
+        """Delete all movies stored on the device"""
+        result = self._valid_response(await self._delete("movies"))
+        self._movies = set()
+        self._store_movies()
+        return result
+
+    async def add_movie(self, movie: TwinklyMovie) -> Any:
+        """Store movie on the device, without playing it"""
+        self._valid_response(await self._post("movies/new", json=movie.descriptor))
+        result = await self._post(
+            "movies/full",
+            data=movie.data,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        self._movies.add(movie.unique_id)
+        self._store_movies()
+        return result
+
+    async def apply_movie(self, movie: TwinklyMovie) -> None:
+        """
+        Play movie, only uploading it if the device does not already store it.
+
+        Movies are identified on the device by a unique id derived from their
+        content hash. Movies uploaded through this method are remembered (in
+        the cache, if any), and if the device is out of movie slots or frame
+        capacity and all stored movies are known, they are all deleted to make
+        room, as the firmware can only delete every stored movie at once.
+        Otherwise, or on firmware without movie storage, the movie is uploaded
+        as the current movie with set_movie().
+        """
+        try:
+            saved = await self.get_saved_movies()
+            descriptor = movie.descriptor
+        except (ClientResponseError, TwinklyError, ValueError) as e:
+            _LOGGER.debug("Movie storage not available: %s", e)
+            await self.set_movie(movie)
+            return
+
+        stored = {m.get("unique_id", "").upper(): m for m in saved["movies"]}
+        if movie.unique_id not in stored:
+            if not self._movie_fits(saved, descriptor["frames_number"]):
+                if not stored.keys() <= self._movies:
+                    _LOGGER.debug("No room for movie %s, uploading as current movie", movie.unique_id)
+                    await self.set_movie(movie)
+                    return
+                _LOGGER.debug("No room for movie %s, deleting %d stored movies", movie.unique_id, len(stored))
+                await self.delete_movies()
+            _LOGGER.debug("Uploading movie %s", movie.unique_id)
+            await self.add_movie(movie)
+            saved = await self.get_saved_movies()
+            stored = {m.get("unique_id", "").upper(): m for m in saved["movies"]}
+        else:
+            _LOGGER.debug("Movie %s already stored as id %s", movie.unique_id, stored[movie.unique_id].get("id"))
+
+        await self.set_current_movie(stored[movie.unique_id]["id"])
+        await self.set_mode("movie")
+
+    def _movie_fits(self, saved: dict[str, Any], frames: int) -> bool:
+        max_movies = saved.get("max") or self._details.get("max_movies")
+        if max_movies is not None and len(saved["movies"]) >= int(max_movies):
+            return False
+        available = saved.get("available_frames")
+        if available is None and "movie_capacity" in self._details:
+            available = int(self._details["movie_capacity"]) - sum(m.get("frames_number", 0) for m in saved["movies"])
+        return available is None or frames <= int(available)
+
+    def _store_movies(self) -> None:
+        if self._cache is not None:
+            self._cache.store(self.host, movies=sorted(self._movies))
 
     async def get_current_colour(self) -> Any:
-        return self._valid_response(await self._get("led/color"))
+        return await self._get_state("colour", lambda: self._get("led/color"))
+
+    async def _get_state(self, field: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Return state from the state cache, or request and validate it"""
+        if self._state is not None and (cached := self._state.get(field)) is not None:
+            return dict(cached)
+        response = self._valid_response(await request())
+        if self._state is not None:
+            self._state.set(field, response)
+        return response
+
+    def _set_state(self, field: str, value: dict[str, Any], response: Any) -> None:
+        """Update state cache with a written value if the write succeeded"""
+        if self._state is None:
+            return
+        try:
+            self._valid_response(response)
+        except TwinklyError:
+            self._state.invalidate(field)
+            return
+        self._cache_state(field, value)
+
+    def _cache_state(self, field: str, value: dict[str, Any]) -> None:
+        if self._state is None:
+            return
+        if self._api_version >= 2:
+            self._state.set(field, {**value, "result": {TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK}})
+        else:
+            self._state.set(field, {**value, TWINKLY_RETURN_CODE: TWINKLY_RETURN_CODE_OK})
 
     async def get_predefined_effects(self) -> Any:
         """Get the list of predefined effects."""
@@ -562,6 +1029,7 @@ class Twinkly:
         await self._post(
             "led/effects/current",
             json={"effect_id": effect_id},
+            idempotent=True,
         )
 
     async def get_playlist(self) -> Any:
@@ -580,11 +1048,18 @@ class Twinkly:
         await self._post(
             "playlist/current",
             json={"id": entry_id},
+            idempotent=True,
         )
 
-    def _valid_response(self, response: dict[Any, Any], check_for: str | None = None) -> dict[Any, Any]:
+    def _valid_response(
+        self,
+        response: dict[Any, Any],
+        check_for: str | None = None,
+        api_version: int | None = None,
+    ) -> dict[Any, Any]:
         """Validate twinkly-responses from the API."""
-        result = response.get("result") if response and self._api_version >= 2 else response
+        api_version = api_version or self._api_version
+        result = response.get("result") if response and api_version >= 2 else response
         if (
             result
             and result.get(TWINKLY_RETURN_CODE) == TWINKLY_RETURN_CODE_OK
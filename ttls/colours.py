@@ -48,6 +48,17 @@ class TwinklyColour:
             **({"cold_white": self.cold_white} if self.cold_white is not None else {}),
         }
 
+    @classmethod
+    def from_dict(cls, d: ColourDict) -> "TwinklyColour":
+        """Create TwinklyColour from a dict as returned by the get-led functions."""
+        return cls(
+            red=d["red"],
+            green=d["green"],
+            blue=d["blue"],
+            white=d.get("white"),
+            cold_white=d.get("cold_white"),
+        )
+
     @classmethod
     def from_twinkly_tuple(cls, t):
         match len(t):
@@ -0,0 +1,80 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+# Constants needed to parse command line arguments live here, without any
+# dependencies, so that the CLI can start without importing the client.
+
+TWINKLY_MODES = [
+    "color",
+    "demo",
+    "effect",
+    "movie",
+    "off",
+    "playlist",
+    "rt",
+]
+
+TWINKLY_MUSIC_DRIVERS_OFFICIAL = {
+    "VU Meter": "00000000-0000-0000-0000-000000000001",
+    "Beat Hue": "00000000-0000-0000-0000-000000000002",
+    "Psychedelica": "00000000-0000-0000-0000-000000000003",
+    "Red Vertigo": "00000000-0000-0000-0000-000000000004",
+    "Dancing Bands": "00000000-0000-0000-0000-000000000005",
+    "Diamond Swirl": "00000000-0000-0000-0000-000000000006",
+    "Joyful Stripes": "00000000-0000-0000-0000-000000000007",
+    "Angel Fade": "00000000-0000-0000-0000-000000000008",
+    "Clockwork": "00000000-0000-0000-0000-000000000009",
+    "Sipario": "00000000-0000-0000-0000-00000000000A",
+    "Sunset": "00000000-0000-0000-0000-00000000000B",
+    "Elevator": "00000000-0000-0000-0000-00000000000C",
+}
+
+TWINKLY_MUSIC_DRIVERS_UNOFFICIAL = {
+    "VU Meter 2": "00000000-0000-0000-0000-000001000001",
+    "Beat Hue 2": "00000000-0000-0000-0000-000001000002",
+    "Psychedelica 2": "00000000-0000-0000-0000-000001000003",
+    "Sparkle": "00000000-0000-0000-0000-000001000005",
+    "Sparkle Hue": "00000000-0000-0000-0000-000001000006",
+    "Psycho Sparkle": "00000000-0000-0000-0000-000001000007",
+    "Psycho Hue": "00000000-0000-0000-0000-000001000008",
+    "Red Line": "00000000-0000-0000-0000-000001000009",
+    "Red Vertigo 2": "00000000-0000-0000-0000-000002000004",
+    "Dancing Bands 2": "00000000-0000-0000-0000-000002000005",
+    "Diamond Swirl 2": "00000000-0000-0000-0000-000002000006",
+    "Angel Fade 2": "00000000-0000-0000-0000-000002000008",
+    "Clockwork 2": "00000000-0000-0000-0000-000002000009",
+    "Sunset 2": "00000000-0000-0000-0000-00000200000B",
+}
+
+TWINKLY_MUSIC_DRIVERS = {
+    **TWINKLY_MUSIC_DRIVERS_OFFICIAL,
+    **TWINKLY_MUSIC_DRIVERS_UNOFFICIAL,
+}
+
+# Number of devices operated on at the same time
+DEFAULT_CONCURRENCY = 8
@@ -0,0 +1,261 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import stat
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+from .cache import TwinklyCache
+from .client import Twinkly
+from .const import DEFAULT_CONCURRENCY
+from .group import TwinklyGroup, TwinklyGroupResult
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# Upper bound of a single request line
+DAEMON_MAX_REQUEST = 1024 * 1024
+
+TwinklyCommand = Callable[[Twinkly, argparse.Namespace], Awaitable[Any]]
+
+
+class TwinklyDaemonError(Exception):
+    pass
+
+
+def default_socket_path() -> str:
+    """
+    Control socket of the daemon, in a private directory of the user.
+
+    The path does not depend on the environment, so that a daemon started
+    from a login session is found by commands run from cron.
+    """
+    return os.path.join("/tmp", f"ttls-{os.getuid()}", "daemon.sock")
+
+
+def check_owner(path: str, directory: bool = False) -> None:
+    """Ensure path belongs to the current user, and is private if a directory"""
+    st = os.lstat(path)
+    if st.st_uid != os.getuid():
+        raise TwinklyDaemonError(f"{path} is not owned by the current user")
+    if directory and (not stat.S_ISDIR(st.st_mode) or st.st_mode & 0o077):
+        raise TwinklyDaemonError(f"{path} is not a private directory")
+
+
+class TwinklyDaemon:
+    """
+    Long-running process keeping warm clients for a set of devices.
+
+    Commands arrive over a Unix domain socket, one JSON object per line:
+
+        {"hosts": ["192.0.2.1"], "command": "mode", "args": {"mode": "off"}}
+
+    and are answered with one JSON object per line, holding the result or the
+    error of every host:
+
+        {"results": {"192.0.2.1": {"result": {"code": 1000}}}}
+
+    Clients, sessions, tokens and device details are kept between commands,
+    so a command only costs the requests it makes. Devices not given at start
+    are added on first use.
+    """
+
+    def __init__(
+        self,
+        commands: dict[str, TwinklyCommand],
+        hosts: Iterable[str] = (),
+        path: str | None = None,
+        cache: TwinklyCache | None = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        keep_warm: bool = False,
+    ):
+        self.commands = commands
+        self.path = path or default_socket_path()
+        self._private = path is None
+        self.keep_warm = keep_warm
+        self.group = TwinklyGroup(hosts, cache=cache, concurrency=concurrency)
+        self._server: asyncio.AbstractServer | None = None
+
+    async def __aenter__(self) -> "TwinklyDaemon":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Listen on the socket and warm up the devices given at start"""
+        if self._private:
+            directory = os.path.dirname(self.path)
+            with contextlib.suppress(FileExistsError):
+                os.mkdir(directory, 0o700)
+            check_owner(directory, directory=True)
+        if os.path.exists(self.path):
+            if await self._is_listening():
+                raise TwinklyDaemonError(f"Daemon already listening on {self.path}")
+            os.unlink(self.path)
+        # Created without access for others, rather than restricted after binding
+        umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, self.path, limit=DAEMON_MAX_REQUEST)
+        finally:
+            os.umask(umask)
+        _LOGGER.info("Listening on %s", self.path)
+        for result in (await self.group.interview()).values():
+            if not result.ok:
+                _LOGGER.warning("Failed to interview %s: %s", result.host, result.error)
+        if self.keep_warm:
+            self.group.keep_warm()
+
+    async def _is_listening(self) -> bool:
+        try:
+            _, writer = await asyncio.open_unix_connection(self.path)
+        except OSError:
+            return False
+        writer.close()
+        await writer.wait_closed()
+        return True
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+        await self.group.close()
+
+    async def execute(self, request: Any) -> dict[str, Any]:
+        """Run a command on its hosts and return the response"""
+        if not isinstance(request, dict):
+            return {"error": "Invalid request: not an object"}
+        command = request.get("command")
+        hosts = request.get("hosts")
+        if not isinstance(command, str) or command not in self.commands:
+            return {"error": f"Unknown command {command}"}
+        if not hosts or not isinstance(hosts, list):
+            return {"error": "No hosts given"}
+        if not all(isinstance(host, str) for host in hosts):
+            return {"error": "Invalid request: hosts must be strings"}
+        if not isinstance(request.get("args") or {}, dict):
+            return {"error": "Invalid request: args must be an object"}
+        for host in hosts:
+            if host not in self.group.devices:
+                self.group.add(host)
+                if self.keep_warm:
+                    self.group.devices[host].keep_warm()
+        args = argparse.Namespace(**(request.get("args") or {}))
+        func = self.commands[command]
+        results = await self.group.run(lambda t: func(t, args), hosts=hosts)
+        return {"results": encode_results(results)}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # The rest of the line is still to come, so the connection is given up
+                    await self._respond(writer, {"error": "Request too large"})
+                    break
+                if not line:
+                    break
+                try:
+                    response = await self.execute(json.loads(line))
+                except ValueError as e:
+                    response = {"error": f"Invalid request: {e}"}
+                await self._respond(writer, response)
+        except ConnectionError as e:
+            _LOGGER.debug("Control connection closed: %s", e)
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, response: dict[str, Any]) -> None:
+        writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+        await writer.drain()
+
+
+def encode_results(results: dict[str, TwinklyGroupResult]) -> dict[str, dict[str, Any]]:
+    """Encode group results for JSON output"""
+    return {
+        host: {"result": result.result} if result.ok else {"error": str(result.error) or repr(result.error)}
+        for host, result in results.items()
+    }
+
+
+def decode_results(results: dict[str, dict[str, Any]]) -> dict[str, TwinklyGroupResult]:
+    """Decode group results from JSON output"""
+    return {
+        host: TwinklyGroupResult(host=host, result=r.get("result"))
+        if "error" not in r
+        else TwinklyGroupResult(host=host, error=TwinklyDaemonError(r["error"]))
+        for host, r in results.items()
+    }
+
+
+async def request(
+    hosts: list[str],
+    command: str,
+    args: dict[str, Any],
+    path: str | None = None,
+) -> dict[str, TwinklyGroupResult]:
+    """Send a command to the daemon and return the result of every host"""
+    if path is None:
+        path = default_socket_path()
+        with contextlib.suppress(FileNotFoundError):
+            check_owner(os.path.dirname(path), directory=True)
+    # Never hand a command to a socket someone else may be listening on
+    try:
+        check_owner(path)
+    except FileNotFoundError as e:
+        raise TwinklyDaemonError(f"No daemon listening on {path}: {e}") from e
+    try:
+        reader, writer = await asyncio.open_unix_connection(path, limit=DAEMON_MAX_REQUEST)
+    except OSError as e:
+        raise TwinklyDaemonError(f"No daemon listening on {path}: {e}") from e
+    try:
+        writer.write(json.dumps({"hosts": hosts, "command": command, "args": args}).encode() + b"\n")
+        await writer.drain()
+        line = await reader.readline()
+    finally:
+        writer.close()
+    if not line:
+        raise TwinklyDaemonError("Daemon closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        raise TwinklyDaemonError(response["error"])
+    return decode_results(response["results"])
@@ -0,0 +1,188 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from typing import Any
+
+from aiohttp import ClientError, ClientSession
+
+from .cache import TwinklyCache, device_id
+from .client import Twinkly, TwinklyError
+from .const import DEFAULT_CONCURRENCY
+from .group import TwinklyGroup
+
+_LOGGER = logging.getLogger(__name__)
+
+TWINKLY_DISCOVERY_PORT = 5555
+TWINKLY_DISCOVERY_MESSAGE = b"\x01discover"
+TWINKLY_DISCOVERY_BROADCAST = "255.255.255.255"
+
+# Time to collect responses, and number of requests sent within it, as
+# datagrams may be lost
+DEFAULT_DISCOVERY_TIMEOUT = 2
+DEFAULT_DISCOVERY_ATTEMPTS = 2
+
+# Registry entries older than this are probed again when seen in a scan
+DEFAULT_REGISTRY_TTL = 24 * 3600
+
+
+def parse_discovery_response(data: bytes) -> tuple[str, str] | None:
+    """Return address and name from a discovery response, or None if not one"""
+    if len(data) < 6 or data[4:6] != b"OK":
+        return None
+    address = ".".join(str(b) for b in reversed(data[0:4]))
+    name = data[6:].split(b"\x00", 1)[0].decode(errors="replace")
+    return address, name
+
+
+class _TwinklyDiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.found: dict[str, str] = {}
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        response = parse_discovery_response(data)
+        if response is None:
+            _LOGGER.debug("Ignoring discovery response from %s: %r", addr[0], data)
+            return
+        address, name = response
+        if address not in self.found:
+            _LOGGER.debug("Discovered %s at %s", name, address)
+        self.found[address] = name
+
+    def error_received(self, exc: Exception) -> None:
+        _LOGGER.debug("Discovery socket error: %s", exc)
+
+
+async def discover(
+    timeout: float = DEFAULT_DISCOVERY_TIMEOUT,
+    address: str = TWINKLY_DISCOVERY_BROADCAST,
+    port: int = TWINKLY_DISCOVERY_PORT,
+    attempts: int = DEFAULT_DISCOVERY_ATTEMPTS,
+) -> dict[str, str]:
+    """Broadcast a discovery request and return the name of every device answering, by address"""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _TwinklyDiscoveryProtocol,
+        local_addr=("0.0.0.0", 0),
+        family=socket.AF_INET,
+        allow_broadcast=True,
+    )
+    try:
+        for _ in range(attempts):
+            transport.sendto(TWINKLY_DISCOVERY_MESSAGE, (address, port))
+            await asyncio.sleep(timeout / attempts)
+    finally:
+        transport.close()
+    return protocol.found
+
+
+class TwinklyRegistry:
+    """
+    Registry of discovered devices, kept in a TwinklyCache.
+
+    A scan discovers devices on the local network and probes only those that
+    are new, stale or renamed for their API version and details, so that
+    Twinkly instances built from the registry start without probing.
+
+        registry = TwinklyRegistry(TwinklyCache())
+        await registry.scan()
+        t = registry.twinkly(host)
+    """
+
+    def __init__(
+        self,
+        cache: TwinklyCache,
+        ttl: float = DEFAULT_REGISTRY_TTL,
+        session: ClientSession | None = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ):
+        self.cache = cache
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._session = session
+
+    @property
+    def devices(self) -> dict[str, dict[str, Any]]:
+        """Registered devices by host"""
+        return {host: entry for host, entry in self.cache.entries().items() if "probed" in entry}
+
+    def is_stale(self, host: str, name: str | None = None) -> bool:
+        entry = self.cache.load(host)
+        if not entry.get("details") or not entry.get("api_version") or "probed" not in entry:
+            return True
+        if name is not None and entry.get("name") != name:
+            return True
+        return entry["probed"] + self.ttl < time.time()
+
+    async def scan(self, timeout: float = DEFAULT_DISCOVERY_TIMEOUT, **kwargs) -> dict[str, dict[str, Any]]:
+        """Discover devices and refresh stale entries, returning entries of devices found"""
+        return await self.refresh(await discover(timeout=timeout, **kwargs))
+
+    async def refresh(self, found: dict[str, str]) -> dict[str, dict[str, Any]]:
+        """Update registry with devices found, given as names by host"""
+        stale = [host for host, name in found.items() if self.is_stale(host, name)]
+        _LOGGER.debug("Found %d devices, probing %d", len(found), len(stale))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(host: str) -> None:
+            async with semaphore:
+                try:
+                    await self._probe(host, found[host])
+                except (ClientError, TimeoutError, TwinklyError) as e:
+                    _LOGGER.warning("Failed to probe %s: %s", host, e)
+
+        await asyncio.gather(*(probe(host) for host in stale))
+        return {host: entry for host, entry in self.devices.items() if host in found}
+
+    async def _probe(self, host: str, name: str) -> None:
+        t = Twinkly(host=host, session=self._session, cache=self.cache)
+        try:
+            # Probed from scratch, as the cached version may be that of another device
+            await t.detect_api_version()
+            t._details = await t.get_details()
+        finally:
+            await t.close()
+        t._store_details()
+        self.cache.store(host, name=name, probed=time.time())
+        # A device that moved to a new address is no longer at the old one
+        current_id = device_id(t._details)
+        for other, entry in self.cache.entries().items():
+            if other != host and entry.get("device_id") == current_id:
+                _LOGGER.debug("Device %s moved from %s to %s", current_id, other, host)
+                self.cache.invalidate(other)
+
+    def twinkly(self, host: str, **kwargs) -> Twinkly:
+        """Create a Twinkly instance for a registered device"""
+        return Twinkly(host=host, cache=self.cache, session=self._session, **kwargs)
+
+    def group(self, hosts: list[str] | None = None, **kwargs) -> TwinklyGroup:
+        """Create a TwinklyGroup of registered devices, by default all of them"""
+        return TwinklyGroup(hosts if hosts is not None else list(self.devices), cache=self.cache, **kwargs)
@@ -0,0 +1,517 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import web
+
+from .realtime import RT_PAYLOAD_MAX_LIGHTS
+
+_LOGGER = logging.getLogger(__name__)
+
+TWINKLY_EMULATOR_TOKEN_EXPIRES_IN = 14400
+TWINKLY_EMULATOR_MAX_MOVIES = 16
+TWINKLY_EMULATOR_MOVIE_CAPACITY = 5000
+
+# Endpoints answered without an authentication token
+TWINKLY_EMULATOR_PUBLIC = {"gestalt", "login"}
+
+Handler = Callable[[web.Request], Awaitable[Any]]
+
+
+@dataclass
+class TwinklyEmulatorFaults:
+    """
+    Faults injected by the emulator.
+
+    Every HTTP request is delayed by latency plus a random jitter. When no
+    request has been made for sleep_after seconds, the radio is asleep and the
+    next request is delayed by wake_latency as well. A disconnect_rate share of
+    requests have their connection closed without an answer, and any
+    connection left idle for more than idle_close seconds is closed.
+    """
+
+    latency: float = 0
+    jitter: float = 0
+    sleep_after: float | None = None
+    wake_latency: float = 3
+    disconnect_rate: float = 0
+    idle_close: float | None = None
+
+
+class _TwinklyRealtimeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, emulator: "TwinklyEmulator"):
+        self.emulator = emulator
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        self.emulator._realtime_datagram(data)
+
+
+class _TwinklyDiscoveryResponder(asyncio.DatagramProtocol):
+    def __init__(self, emulator: "TwinklyEmulator"):
+        self.emulator = emulator
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        if data == b"\x01discover":
+            address = bytes(reversed(socket.inet_aton(self.emulator.host)))
+            self.transport.sendto(address + b"OK" + self.emulator.name.encode() + b"\x00", addr)
+
+
+class TwinklyEmulator:
+    """
+    Local emulation of a Twinkly device, for testing and benchmarking.
+
+    The emulator serves the HTTP API of the given version and receives
+    realtime frames over UDP with protocol versions 1, 2 and 3. Frames are
+    only accepted in "rt" mode and with a valid token, like on a device. If a
+    discovery port is given, discovery requests are answered on it.
+    Faults such as latency, radio sleep and dropped connections are injected
+    according to faults.
+
+        async with TwinklyEmulator(api_version=2) as emulator:
+            t = Twinkly(host=emulator.address, api_version=2)
+            t._rt_port = emulator.rt_port
+    """
+
+    def __init__(
+        self,
+        api_version: int = 1,
+        leds: int = 250,
+        led_profile: str = "RGB",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rt_port: int = 0,
+        discovery_port: int | None = None,
+        faults: TwinklyEmulatorFaults | None = None,
+        name: str = "Twinkly",
+        seed: int | None = None,
+    ):
+        if api_version not in (1, 2):
+            raise ValueError(f"Unsupported API version {api_version}")
+        self.api_version = api_version
+        self.leds = leds
+        self.led_profile = led_profile
+        self.host = host
+        self.port = port
+        self.rt_port = rt_port
+        self.discovery_port = discovery_port
+        self.faults = faults or TwinklyEmulatorFaults()
+        self.name = name
+        self.uuid = str(uuid.uuid4()).upper()
+        self.mac = ":".join(f"{b:02x}" for b in os.urandom(6))
+        self.tokens: dict[str, float] = {}
+        self.mode = "movie"
+        self.brightness = {"mode": "enabled", "value": 100}
+        self.colour = {"red": 0, "green": 0, "blue": 0}
+        self.movie = b""
+        self.movie_config = {"frames_number": 0, "loop_type": 0, "frame_delay": 100, "leds_number": leds}
+        self.movies: list[dict[str, Any]] = []
+        self.current_movie: int | None = None
+        self.frame = bytearray(leds * self.bytes_per_led)
+        self.requests: list[str] = []
+        self.frames = Counter()
+        self.datagrams = Counter()
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._last_request: float | None = None
+        self._next_movie_id = 0
+        self._runner: web.AppRunner | None = None
+        self._transport: asyncio.DatagramTransport | None = None
+        self._discovery: asyncio.DatagramTransport | None = None
+
+    @property
+    def bytes_per_led(self) -> int:
+        return len(self.led_profile)
+
+    @property
+    def address(self) -> str:
+        """Host and port to use as Twinkly host"""
+        return f"{self.host}:{self.port}"
+
+    async def __aenter__(self) -> "TwinklyEmulator":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def start(self) -> None:
+        app = web.Application(middlewares=[self._middleware])
+        self._add_routes(app)
+        keepalive = self.faults.idle_close if self.faults.idle_close is not None else 75
+        self._runner = web.AppRunner(app, access_log=None, keepalive_timeout=keepalive)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _TwinklyRealtimeProtocol(self),
+            local_addr=(self.host, self.rt_port),
+        )
+        self.rt_port = self._transport.get_extra_info("sockname")[1]
+        if self.discovery_port is not None:
+            self._discovery, _ = await loop.create_datagram_endpoint(
+                lambda: _TwinklyDiscoveryResponder(self),
+                local_addr=(self.host, self.discovery_port),
+            )
+            self.discovery_port = self._discovery.get_extra_info("sockname")[1]
+        _LOGGER.info(
+            "Emulating API v%d device on %s, realtime on port %d", self.api_version, self.address, self.rt_port
+        )
+
+    async def stop(self) -> None:
+        if self._discovery is not None:
+            self._discovery.close()
+            self._discovery = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _add_routes(self, app: web.Application) -> None:
+        v1 = self.api_version == 1
+        routes: list[tuple[str, str, Handler]] = [
+            ("GET", "gestalt", self._gestalt),
+            ("POST", "login", self._login),
+            ("POST", "verify", self._ok),
+            ("POST", "logout", self._logout),
+            ("GET", "device_name" if v1 else "device/name", self._get_name),
+            ("POST", "device_name" if v1 else "device/name", self._set_name),
+            ("GET", "network/status" if v1 else "network/eth/status", self._network),
+            ("GET", "fw/version" if v1 else "fw/ct1/version", self._firmware),
+            ("GET", "reset", self._ok),
+            ("GET", "summary", self._summary),
+            ("GET", "led/mode" if v1 else "application/mode", self._get_mode),
+            ("POST", "led/mode" if v1 else "application/mode", self._set_mode),
+            ("GET", "led/out/brightness", self._get_brightness),
+            ("POST", "led/out/brightness", self._set_brightness),
+            ("GET", "led/color", self._get_colour),
+            ("POST", "led/color", self._set_colour),
+            ("GET", "led/movie/config", self._get_movie_config),
+            ("POST", "led/movie/config", self._set_movie_config),
+            ("POST", "led/movie/full", self._upload_movie),
+            ("GET", "movies", self._get_movies),
+            ("DELETE", "movies", self._delete_movies),
+            ("POST", "movies/new", self._new_movie),
+            ("POST", "movies/full", self._upload_stored_movie),
+            ("GET", "movies/current", self._get_current_movie),
+            ("POST", "movies/current", self._set_current_movie),
+        ]
+        for method, endpoint, handler in routes:
+            app.router.add_route(method, f"/xled/v{self.api_version}/{endpoint}", handler)
+        app.router.add_get("/xled/info", self._info)
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler: Handler) -> web.StreamResponse:
+        endpoint = request.path.removeprefix(f"/xled/v{self.api_version}/")
+        self.requests.append(f"{request.method} {endpoint}")
+        if request.match_info.http_exception is not None:
+            raise request.match_info.http_exception
+        now = time.monotonic()
+        delay = self.faults.latency + self.faults.jitter * self._random.random()
+        if (
+            self.faults.sleep_after is not None
+            and self._last_request is not None
+            and now - self._last_request > self.faults.sleep_after
+        ):
+            # Only the request that wakes the radio pays for it
+            _LOGGER.debug("Radio asleep, waking up")
+            delay += self.faults.wake_latency
+        # The radio stays awake until the answer has been sent
+        self._last_request = now + delay
+        if delay:
+            await asyncio.sleep(delay)
+        if self.faults.disconnect_rate and self._random.random() < self.faults.disconnect_rate:
+            _LOGGER.debug("Dropping connection for %s %s", request.method, endpoint)
+            request.transport.close()
+            raise asyncio.CancelledError
+        public = endpoint in TWINKLY_EMULATOR_PUBLIC or request.path == "/xled/info"
+        if not public and self._token_expires(request.headers.get("X-Auth-Token")) is None:
+            raise web.HTTPUnauthorized()
+        result = await handler(request)
+        if isinstance(result, web.StreamResponse):
+            return result
+        return web.json_response(self._result(result))
+
+    def _result(self, data: dict[str, Any]) -> dict[str, Any]:
+        if self.api_version == 1:
+            return {**data, "code": 1000}
+        return {**data, "result": {"code": 1000}}
+
+    def _token_expires(self, token: str | None) -> float | None:
+        expires = self.tokens.get(token) if token else None
+        if expires is None or expires < time.time():
+            return None
+        return expires
+
+    def _realtime_datagram(self, data: bytes) -> None:
+        if len(data) < 10:
+            self.rejected += 1
+            return
+        # The first byte of a version 2 datagram is its segment count, so
+        # tell it from version 1 by the header length
+        if data[0] == 3:
+            version = 3
+        elif data[0] == 1 and len(data) == 10 + len(self.frame):
+            version = 1
+        else:
+            version = 2
+        token = base64.b64encode(data[1:9]).decode()
+        if self._token_expires(token) is None or self.mode != "rt":
+            self.rejected += 1
+            return
+        self.datagrams[version] += 1
+        if version == 1:
+            payload, offset, last = data[10:], 0, True
+        else:
+            segment = data[11]
+            segment_size = RT_PAYLOAD_MAX_LIGHTS * self.bytes_per_led
+            payload, offset = data[12:], segment * segment_size
+            last = offset + len(payload) >= len(self.frame)
+        self.frame[offset : offset + len(payload)] = payload[: len(self.frame) - offset]
+        if last:
+            self.frames[version] += 1
+
+    async def _info(self, request: web.Request) -> dict[str, Any]:
+        return {"fw_family": "F", "uuid": self.uuid}
+
+    async def _gestalt(self, request: web.Request) -> dict[str, Any]:
+        return {
+            "product_name": "Twinkly",
+            "device_name": self.name,
+            "product_code": "EMULATOR",
+            "fw_family": "F",
+            "mac": self.mac,
+            "uuid": self.uuid,
+            "bytes_per_led": self.bytes_per_led,
+            "number_of_led": self.leds,
+            "max_supported_led": self.leds,
+            "led_profile": self.led_profile,
+            "frame_rate": 25,
+            "measured_frame_rate": 25,
+            "movie_capacity": TWINKLY_EMULATOR_MOVIE_CAPACITY,
+            "max_movies": TWINKLY_EMULATOR_MAX_MOVIES,
+        }
+
+    async def _login(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        token = base64.b64encode(os.urandom(8)).decode()
+        self.tokens[token] = time.time() + TWINKLY_EMULATOR_TOKEN_EXPIRES_IN
+        # The login response has its code at the top level in every API version
+        return web.json_response(
+            {
+                "authentication_token": token,
+                "authentication_token_expires_in": TWINKLY_EMULATOR_TOKEN_EXPIRES_IN,
+                "challenge-response": base64.b64encode(payload["challenge"].encode()[:32]).decode(),
+                "code": 1000,
+            }
+        )
+
+    async def _logout(self, request: web.Request) -> dict[str, Any]:
+        self.tokens.pop(request.headers.get("X-Auth-Token"), None)
+        return {}
+
+    async def _ok(self, request: web.Request) -> dict[str, Any]:
+        return {}
+
+    async def _get_name(self, request: web.Request) -> dict[str, Any]:
+        return {"name": self.name}
+
+    async def _set_name(self, request: web.Request) -> dict[str, Any]:
+        self.name = (await request.json())["name"]
+        return {"name": self.name}
+
+    async def _network(self, request: web.Request) -> dict[str, Any]:
+        return {"mode": 1, "station": {"ip": self.host, "rssi": -50}}
+
+    async def _firmware(self, request: web.Request) -> dict[str, Any]:
+        return {"version": "2.8.18"}
+
+    async def _summary(self, request: web.Request) -> dict[str, Any]:
+        led_mode: dict[str, Any] = {"mode": self.mode}
+        if self.mode == "movie" and (movie := self._current_movie()) is not None:
+            led_mode.update({k: movie[k] for k in ("id", "unique_id", "name")})
+        return {
+            "led_mode": led_mode,
+            "filters": [{"filter": "brightness", "config": dict(self.brightness)}],
+            "color": dict(self.colour),
+            "network": await self._network(request),
+        }
+
+    async def _get_mode(self, request: web.Request) -> dict[str, Any]:
+        return {"mode": self.mode}
+
+    async def _set_mode(self, request: web.Request) -> dict[str, Any]:
+        self.mode = (await request.json())["mode"]
+        return {}
+
+    async def _get_brightness(self, request: web.Request) -> dict[str, Any]:
+        return dict(self.brightness)
+
+    async def _set_brightness(self, request: web.Request) -> dict[str, Any]:
+        payload = await request.json()
+        self.brightness = {"mode": payload.get("mode", "enabled"), "value": payload["value"]}
+        return {}
+
+    async def _get_colour(self, request: web.Request) -> dict[str, Any]:
+        return dict(self.colour)
+
+    async def _set_colour(self, request: web.Request) -> dict[str, Any]:
+        self.colour = await request.json()
+        return {}
+
+    async def _get_movie_config(self, request: web.Request) -> dict[str, Any]:
+        return dict(self.movie_config)
+
+    async def _set_movie_config(self, request: web.Request) -> dict[str, Any]:
+        self.movie_config.update(await request.json())
+        return {}
+
+    async def _upload_movie(self, request: web.Request) -> dict[str, Any]:
+        self.movie = await request.read()
+        return {"frames_number": len(self.movie) // (self.leds * self.bytes_per_led)}
+
+    async def _get_movies(self, request: web.Request) -> dict[str, Any]:
+        used = sum(m["frames_number"] for m in self.movies)
+        return {
+            "movies": [{k: v for k, v in m.items() if k != "data"} for m in self.movies],
+            "available_frames": TWINKLY_EMULATOR_MOVIE_CAPACITY - used,
+            "max_capacity": TWINKLY_EMULATOR_MOVIE_CAPACITY,
+            "max": TWINKLY_EMULATOR_MAX_MOVIES,
+        }
+
+    async def _delete_movies(self, request: web.Request) -> dict[str, Any]:
+        self.movies = []
+        self.current_movie = None
+        return {}
+
+    async def _new_movie(self, request: web.Request) -> dict[str, Any]:
+        if len(self.movies) >= TWINKLY_EMULATOR_MAX_MOVIES:
+            raise web.HTTPBadRequest()
+        movie = {**await request.json(), "id": self._next_movie_id}
+        self._next_movie_id += 1
+        self.movies.append(movie)
+        return {}
+
+    async def _upload_stored_movie(self, request: web.Request) -> dict[str, Any]:
+        if not self.movies:
+            raise web.HTTPBadRequest()
+        self.movies[-1]["data"] = await request.read()
+        return {"frames_number": self.movies[-1]["frames_number"]}
+
+    def _current_movie(self) -> dict[str, Any] | None:
+        return next((m for m in self.movies if m["id"] == self.current_movie), None)
+
+    async def _get_current_movie(self, request: web.Request) -> dict[str, Any]:
+        movie = self._current_movie()
+        return {k: movie[k] for k in ("id", "unique_id", "name")} if movie else {"id": -1}
+
+    async def _set_current_movie(self, request: web.Request) -> dict[str, Any]:
+        movie_id = (await request.json())["id"]
+        if not any(m["id"] == movie_id for m in self.movies):
+            raise web.HTTPBadRequest()
+        self.current_movie = movie_id
+        return {}
+
+
+async def serve(emulator: TwinklyEmulator) -> None:
+    """Run emulator until cancelled"""
+    async with emulator:
+        print(f"Twinkly API v{emulator.api_version} on {emulator.address}, realtime on UDP port {emulator.rt_port}")
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.Event().wait()
+
+
+def main() -> None:
+    """Main function"""
+
+    parser = argparse.ArgumentParser(description="Twinkly device emulator")
+    parser.add_argument("--api-version", metavar="version", type=int, choices=(1, 2), default=1, help="API version")
+    parser.add_argument("--leds", metavar="n", type=int, default=250, help="Number of LEDs")
+    parser.add_argument("--profile", metavar="profile", choices=("RGB", "RGBW"), default="RGB", help="LED profile")
+    parser.add_argument("--host", metavar="address", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", metavar="port", type=int, default=8080, help="HTTP port")
+    parser.add_argument("--rt-port", metavar="port", type=int, default=7777, help="Realtime UDP port")
+    parser.add_argument("--discovery-port", metavar="port", type=int, help="Discovery UDP port")
+    parser.add_argument("--latency", metavar="seconds", type=float, default=0, help="Request latency")
+    parser.add_argument("--jitter", metavar="seconds", type=float, default=0, help="Random extra request latency")
+    parser.add_argument("--sleep-after", metavar="seconds", type=float, help="Idle time before the radio sleeps")
+    parser.add_argument("--wake-latency", metavar="seconds", type=float, default=3, help="Radio wake-up latency")
+    parser.add_argument("--disconnect-rate", metavar="rate", type=float, default=0, help="Share of dropped requests")
+    parser.add_argument("--idle-close", metavar="seconds", type=float, help="Close connections idle this long")
+    parser.add_argument("--seed", metavar="n", type=int, help="Random seed for fault injection")
+    parser.add_argument("--debug", action="store_true", help="Enable debugging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    faults = TwinklyEmulatorFaults(
+        latency=args.latency,
+        jitter=args.jitter,
+        sleep_after=args.sleep_after,
+        wake_latency=args.wake_latency,
+        disconnect_rate=args.disconnect_rate,
+        idle_close=args.idle_close,
+    )
+    emulator = TwinklyEmulator(
+        api_version=args.api_version,
+        leds=args.leds,
+        led_profile=args.profile,
+        host=args.host,
+        port=args.port,
+        rt_port=args.rt_port,
+        discovery_port=args.discovery_port,
+        faults=faults,
+        seed=args.seed,
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(emulator))
+
+
+if __name__ == "__main__":
+    main()
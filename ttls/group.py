@@ -0,0 +1,179 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import ClientSession
+
+from .cache import TwinklyCache
+from .client import Twinkly, twinkly_session
+from .const import DEFAULT_CONCURRENCY
+from .realtime import RT_TOKEN_REFRESH_MARGIN, TwinklyBroadcastSession, TwinklyDatagramEndpoint
+from .scene import TwinklyScene
+from .warmer import TwinklyWarmer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class TwinklyGroupResult:
+    """Result of an operation on a single device in a group"""
+
+    host: str
+    result: Any = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class TwinklyGroup:
+    """
+    Group of Twinkly devices sharing one ClientSession and one UDP endpoint.
+
+    Bulk operations run concurrently on all devices, bounded by concurrency,
+    and return a TwinklyGroupResult per host instead of failing the whole
+    batch when a single device fails.
+    """
+
+    def __init__(
+        self,
+        hosts: Iterable[str],
+        session: ClientSession | None = None,
+        timeout: int | None = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        cache: TwinklyCache | None = None,
+    ):
+        self.concurrency = concurrency
+        self._session = session
+        self._shared_session = session is not None
+        self._timeout = timeout
+        self._cache = cache
+        self._endpoint = TwinklyDatagramEndpoint()
+        self.devices: dict[str, Twinkly] = {}
+        for host in hosts:
+            self.add(host)
+
+    async def __aenter__(self) -> "TwinklyGroup":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def __getitem__(self, host: str) -> Twinkly:
+        return self.devices[host]
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def add(self, host: str) -> Twinkly:
+        """Add device to the group, unless already in it, and return it"""
+        if host not in self.devices:
+            self.devices[host] = Twinkly(
+                host=host,
+                session=self._session,
+                timeout=self._timeout,
+                endpoint=self._endpoint,
+                cache=self._cache,
+            )
+        return self.devices[host]
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None:
+            self._session = twinkly_session()
+        for device in self.devices.values():
+            if device._session is not self._session:
+                device._session = self._session
+                device._shared_session = True
+        return self._session
+
+    def realtime(self, version: int = 3, refresh_margin: float = RT_TOKEN_REFRESH_MARGIN) -> TwinklyBroadcastSession:
+        """Realtime session treating all devices, in order, as one display"""
+        self._get_session()
+        return TwinklyBroadcastSession(self.devices.values(), version=version, refresh_margin=refresh_margin)
+
+    def keep_warm(self, **kwargs) -> dict[str, TwinklyWarmer]:
+        """Start keeping the radio of every device awake"""
+        self._get_session()
+        return {host: device.keep_warm(**kwargs) for host, device in self.devices.items()}
+
+    async def warm(self) -> dict[str, TwinklyGroupResult]:
+        """Wake every device radio ahead of an operation"""
+        return await self.run(lambda t: t.warm())
+
+    async def close(self) -> None:
+        for device in self.devices.values():
+            await device.close()
+        if self._session is not None and not self._shared_session:
+            await self._session.close()
+            self._session = None
+        self._endpoint.close()
+
+    async def run(
+        self,
+        func: Callable[[Twinkly], Awaitable[Any]],
+        hosts: Iterable[str] | None = None,
+    ) -> dict[str, TwinklyGroupResult]:
+        """Run func on every device, or the given ones, concurrently"""
+        self._get_session()
+        devices = self.devices if hosts is None else {host: self.devices[host] for host in hosts}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(host: str, device: Twinkly) -> TwinklyGroupResult:
+            async with semaphore:
+                try:
+                    return TwinklyGroupResult(host=host, result=await func(device))
+                except Exception as e:
+                    _LOGGER.debug("Operation failed on %s: %s", host, e)
+                    return TwinklyGroupResult(host=host, error=e)
+
+        results = await asyncio.gather(*(run_one(host, device) for host, device in devices.items()))
+        return {result.host: result for result in results}
+
+    async def interview(self, force: bool | None = False) -> dict[str, TwinklyGroupResult]:
+        return await self.run(lambda t: t.interview(force=force))
+
+    async def set_mode(self, mode: str) -> dict[str, TwinklyGroupResult]:
+        return await self.run(lambda t: t.set_mode(mode))
+
+    async def set_brightness(self, percent: int) -> dict[str, TwinklyGroupResult]:
+        return await self.run(lambda t: t.set_brightness(percent))
+
+    async def apply_scene(self, scene: TwinklyScene) -> dict[str, TwinklyGroupResult]:
+        return await self.run(lambda t: t.apply_scene(scene))
+
+    async def turn_on(self) -> dict[str, TwinklyGroupResult]:
+        return await self.run(lambda t: t.turn_on())
+
+    async def turn_off(self) -> dict[str, TwinklyGroupResult]:
+        return await self.run(lambda t: t.turn_off())
@@ -0,0 +1,116 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# Twinkly controllers drop connections when sent parallel requests, so by
+# default requests to a device are sent one at a time.
+DEFAULT_REQUEST_CONCURRENCY = 1
+
+
+class TwinklyRequestLimiter:
+    """
+    Limit the number of concurrent requests to a device.
+
+    Requests beyond the limit wait in a queue ordered by priority (lower
+    values first) and then by arrival. Queue depth and waiting times are
+    recorded, so callers can see when they are being throttled.
+    """
+
+    def __init__(self, limit: int = DEFAULT_REQUEST_CONCURRENCY):
+        if limit < 1:
+            raise ValueError("Invalid request concurrency limit")
+        self.limit = limit
+        self.requests = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def active(self) -> int:
+        """Number of requests currently in flight"""
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a slot"""
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.requests if self.requests else 0.0
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        started = time.monotonic()
+        if self._active < self.limit and not self.queue_depth:
+            self._active += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass the slot on if it was handed over just as we were cancelled
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+        wait = time.monotonic() - started
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the slot over directly, so it cannot be taken out of order
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL) -> AsyncIterator[None]:
+        """Hold a request slot for the duration of the context"""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,314 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, BinaryIO
+
+from .realtime import TwinklyFrame
+
+_LOGGER = logging.getLogger(__name__)
+
+MOVIE_CHUNK_SIZE = 64 * 1024
+MOVIE_DEFAULT_FRAME_DELAY = 100
+
+# Descriptor types used when storing movies on the device
+TWINKLY_MOVIE_DESCRIPTOR_TYPES = {
+    3: "rgb_raw",
+    4: "rgbw_raw",
+}
+
+# Positions of the input channels (R,G,B), (R,G,B,W) or (R,G,B,W,CW), as used
+# by TwinklyColour.as_tuple(), in Twinkly order (R,G,B), (W,R,G,B) or
+# (CW,W,R,G,B) as used by TwinklyColour.as_twinkly_tuple().
+TWINKLY_CHANNEL_ORDER = {
+    3: (0, 1, 2),
+    4: (3, 0, 1, 2),
+    5: (4, 3, 0, 1, 2),
+}
+
+TwinklyMovieSource = bytes | bytearray | memoryview | str | os.PathLike | BinaryIO | AsyncIterable[bytes]
+
+
+@dataclass
+class TwinklyTransferProgress:
+    """Progress of a movie upload"""
+
+    sent: int
+    total: int | None
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def movie_size(source: TwinklyMovieSource) -> int | None:
+    """Return size of movie in bytes, or None if it cannot be known in advance"""
+    if isinstance(source, bytes | bytearray | memoryview):
+        return memoryview(source).nbytes
+    if isinstance(source, str | os.PathLike):
+        return os.path.getsize(source)
+    if hasattr(source, "seekable") and source.seekable():
+        position = source.tell()
+        end = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return end - position
+    return None
+
+
+def movie_frames(size: int, leds: int, bytes_per_led: int = 3) -> int:
+    """Return number of frames in a movie of size bytes"""
+    frame_size = leds * bytes_per_led
+    if frame_size == 0 or size == 0 or size % frame_size:
+        raise ValueError(f"Movie size {size} is not a whole number of {leds} LED frames")
+    return size // frame_size
+
+
+class TwinklyMovieStream:
+    """
+    Async iterable yielding a movie in chunks, for streaming uploads.
+
+    The source may be a bytes-like object, a file path, a binary file object
+    or an async iterator of bytes. The size is taken from the source where
+    possible, and must otherwise be given for it to be known in advance; a
+    source not holding exactly that many bytes fails. Progress is reported
+    after every chunk. Sources that can be read again (everything but non-seekable files and
+    async iterators) may be iterated more than once, so that an upload can be
+    retried.
+    """
+
+    def __init__(
+        self,
+        source: TwinklyMovieSource,
+        chunk_size: int = MOVIE_CHUNK_SIZE,
+        progress: Callable[[TwinklyTransferProgress], Any] | None = None,
+        size: int | None = None,
+    ):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.progress = progress
+        known = movie_size(source)
+        self.size = size if size is not None else known
+        self._position = source.tell() if known is not None and hasattr(source, "tell") else None
+        self._iterated = False
+
+    @property
+    def replayable(self) -> bool:
+        return isinstance(self.source, bytes | bytearray | memoryview | str | os.PathLike) or self._position is not None
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        if self._iterated and not self.replayable:
+            raise RuntimeError("Movie stream cannot be replayed")
+        self._iterated = True
+        return self._chunks()
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        started = time.monotonic()
+        sent = 0
+        async for chunk in self._read():
+            sent += len(chunk)
+            if self.size is not None and sent > self.size:
+                raise ValueError(f"Movie is larger than {self.size} bytes")
+            if self.progress is not None:
+                self.progress(TwinklyTransferProgress(sent=sent, total=self.size, elapsed=time.monotonic() - started))
+            yield chunk
+        if self.size is not None and sent != self.size:
+            raise ValueError(f"Movie ended after {sent} of {self.size} bytes")
+        elapsed = time.monotonic() - started
+        _LOGGER.debug(
+            "Streamed %d bytes in %.2f s (%.0f bytes/s)",
+            sent,
+            elapsed,
+            TwinklyTransferProgress(sent=sent, total=self.size, elapsed=elapsed).throughput,
+        )
+
+    async def _read(self) -> AsyncIterator[bytes]:
+        source = self.source
+        if isinstance(source, bytes | bytearray | memoryview):
+            view = memoryview(source).cast("B")
+            for i in range(0, len(view), self.chunk_size):
+                yield bytes(view[i : i + self.chunk_size])
+        elif isinstance(source, str | os.PathLike):
+            loop = asyncio.get_running_loop()
+            f = await loop.run_in_executor(None, open, source, "rb")
+            try:
+                while chunk := await loop.run_in_executor(None, f.read, self.chunk_size):
+                    yield chunk
+            finally:
+                f.close()
+        elif isinstance(source, AsyncIterable):
+            async for chunk in source:
+                yield chunk
+        else:
+            loop = asyncio.get_running_loop()
+            if self._position is not None:
+                source.seek(self._position)
+            while chunk := await loop.run_in_executor(None, source.read, self.chunk_size):
+                yield chunk
+
+
+class TwinklyMovie:
+    """
+    Movie ready for upload, as raw bytes in Twinkly channel order.
+
+    Movies are most efficiently built from a (frames, leds, channels) uint8
+    array, such as a NumPy array, or from a flat buffer of the same layout.
+    Channels are given in (R,G,B), (R,G,B,W) or (R,G,B,W,CW) order and are
+    reordered to Twinkly order without per-pixel Python work, unless
+    twinkly_order is set because the data is already in Twinkly order.
+    NumPy is optional and never imported, arrays are only used through their
+    own methods.
+    """
+
+    def __init__(
+        self,
+        data: bytes,
+        leds: int,
+        channels: int = 3,
+        frame_delay: int = MOVIE_DEFAULT_FRAME_DELAY,
+        loop_type: int = 0,
+    ):
+        self.data = data
+        self.leds = leds
+        self.channels = channels
+        self.frames = movie_frames(len(data), leds, channels)
+        self.frame_delay = frame_delay
+        self.loop_type = loop_type
+
+    def __bytes__(self) -> bytes:
+        return self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def digest(self) -> str:
+        """Content hash of movie data and playback parameters"""
+        h = hashlib.sha256()
+        h.update(f"{self.leds}:{self.channels}:{self.frame_delay}:{self.loop_type}:".encode())
+        h.update(self.data)
+        return h.hexdigest()
+
+    @property
+    def unique_id(self) -> str:
+        """Unique id derived from the digest, identifying the movie on the device"""
+        return str(uuid.UUID(self.digest[:32])).upper()
+
+    @property
+    def descriptor(self) -> dict[str, Any]:
+        """Parameters for storing the movie on the device"""
+        if self.channels not in TWINKLY_MOVIE_DESCRIPTOR_TYPES:
+            raise ValueError(f"Movies with {self.channels} channels cannot be stored on the device")
+        return {
+            "name": self.unique_id[:15],
+            "unique_id": self.unique_id,
+            "descriptor_type": TWINKLY_MOVIE_DESCRIPTOR_TYPES[self.channels],
+            "leds_per_frame": self.leds,
+            "frames_number": self.frames,
+            "fps": max(1, round(1000 / self.frame_delay)) if self.frame_delay else 1,
+        }
+
+    @property
+    def config(self) -> dict[str, int]:
+        """Parameters for Twinkly.set_movie_config()"""
+        return {
+            "frames_number": self.frames,
+            "loop_type": self.loop_type,
+            "frame_delay": self.frame_delay,
+            "leds_number": self.leds,
+        }
+
+    @classmethod
+    def from_array(
+        cls,
+        array: Any,
+        leds: int | None = None,
+        channels: int | None = None,
+        twinkly_order: bool = False,
+        frame_delay: int = MOVIE_DEFAULT_FRAME_DELAY,
+        loop_type: int = 0,
+    ) -> "TwinklyMovie":
+        """
+        Build movie from a (frames, leds, channels) uint8 array, or from a flat
+        buffer together with the number of leds and channels.
+        """
+        # Arrays such as NumPy ones, but not memoryviews which lack a dtype
+        if hasattr(array, "dtype") and hasattr(array, "shape") and len(array.shape) == 3:
+            if str(array.dtype) != "uint8":
+                raise TypeError("Movie array must be of type uint8")
+            _, leds, channels = array.shape
+            order = cls._channel_order(channels, twinkly_order)
+            data = array.tobytes() if order is None else array[..., list(order)].tobytes()
+            return cls(data, leds, channels, frame_delay=frame_delay, loop_type=loop_type)
+
+        view = memoryview(array)
+        if view.ndim == 3:
+            _, leds, channels = view.shape
+        if view.format not in ("B", "b", "c"):
+            raise TypeError("Movie buffer must hold unsigned bytes")
+        if leds is None:
+            raise ValueError("Number of leds required for flat buffers")
+        channels = channels or 3
+        data = view.tobytes()
+        order = cls._channel_order(channels, twinkly_order)
+        if order is not None:
+            reordered = bytearray(len(data))
+            for target, source in enumerate(order):
+                reordered[target::channels] = data[source::channels]
+            data = bytes(reordered)
+        return cls(data, leds, channels, frame_delay=frame_delay, loop_type=loop_type)
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: list[TwinklyFrame],
+        frame_delay: int = MOVIE_DEFAULT_FRAME_DELAY,
+        loop_type: int = 0,
+    ) -> "TwinklyMovie":
+        """Build movie from frames of colour tuples in Twinkly order"""
+        leds = len(frames[0])
+        data = bytes(chain.from_iterable(chain.from_iterable(frames)))
+        return cls(data, leds, len(data) // (leds * len(frames)), frame_delay=frame_delay, loop_type=loop_type)
+
+    @staticmethod
+    def _channel_order(channels: int, twinkly_order: bool) -> tuple[int, ...] | None:
+        if channels not in TWINKLY_CHANNEL_ORDER:
+            raise ValueError(f"Unsupported number of channels {channels}")
+        order = TWINKLY_CHANNEL_ORDER[channels]
+        if twinkly_order or order == tuple(range(channels)):
+            return None
+        return order
@@ -0,0 +1,564 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import base64
+import bisect
+import contextlib
+import logging
+import socket
+import time
+from collections.abc import AsyncIterable, Iterable
+from dataclasses import dataclass
+from itertools import chain
+from typing import TYPE_CHECKING, Any
+
+from .colours import TwinklyColourTuple
+
+if TYPE_CHECKING:
+    from .client import Twinkly
+
+_LOGGER = logging.getLogger(__name__)
+
+TwinklyFrame = list[TwinklyColourTuple]
+
+RT_PAYLOAD_MAX_LIGHTS = 300
+RT_PROTOCOL_VERSIONS = (1, 2, 3)
+
+# Refresh the token this many seconds before it expires, and wait this long
+# before trying again if a refresh fails.
+RT_TOKEN_REFRESH_MARGIN = 60
+RT_TOKEN_REFRESH_RETRY = 5
+
+# Frame rate used when the device does not report one
+RT_DEFAULT_FRAME_RATE = 25
+
+
+class TwinklyFrameEncoder:
+    """
+    Encode realtime frames into UDP datagrams.
+
+    Frames may be given as a TwinklyFrame (a list of colour tuples in Twinkly
+    order) or as any object supporting the buffer protocol holding the already
+    flattened pixel bytes. Datagram buffers are allocated once and reused for
+    every frame, and the decoded token header is only rebuilt when the token
+    changes. The returned memoryviews are only valid until the next call to
+    encode().
+
+    Frames must hold bytes_per_led bytes for every LED when it is given, as
+    it is by Twinkly; otherwise it is taken from the size of each frame.
+    """
+
+    def __init__(self, length: int, version: int = 1, bytes_per_led: int | None = None):
+        if version not in RT_PROTOCOL_VERSIONS:
+            raise ValueError(f"Unsupported realtime protocol version {version}")
+        self.length = length
+        self.version = version
+        self.bytes_per_led = bytes_per_led
+        self._token: str | None = None
+        self._token_bytes = b""
+        self._bytes_per_led: int | None = None
+        self._buffers: list[bytearray] = []
+        self._header_length = 0
+
+    def set_token(self, token: str) -> None:
+        """Set authentication token, rebuilding headers only if it changed"""
+        if token == self._token:
+            return
+        self._token_bytes = base64.b64decode(token)
+        self._token = token
+        self._buffers = []
+
+    def encode(self, frame: TwinklyFrame | Any) -> list[memoryview]:
+        """Encode frame into one or more datagrams"""
+        if self._token is None:
+            raise ValueError("Token not set")
+        payload = self._flatten(frame)
+        bytes_per_led = len(payload) // self.length
+        if bytes_per_led != self._bytes_per_led or not self._buffers:
+            self._allocate(bytes_per_led)
+        if self.version == 1:
+            buffer = self._buffers[0]
+            buffer[self._header_length :] = payload
+            return [memoryview(buffer)]
+        segment_size = RT_PAYLOAD_MAX_LIGHTS * bytes_per_led
+        datagrams = []
+        for i, buffer in enumerate(self._buffers):
+            buffer[self._header_length :] = payload[i * segment_size : (i + 1) * segment_size]
+            datagrams.append(memoryview(buffer))
+        return datagrams
+
+    def _flatten(self, frame: TwinklyFrame | Any) -> memoryview:
+        if isinstance(frame, list | tuple):
+            if len(frame) != self.length:
+                raise ValueError("Invalid frame length")
+            payload = memoryview(bytes(chain.from_iterable(frame)))
+        else:
+            payload = memoryview(frame)
+            if payload.format != "B" or payload.ndim != 1:
+                payload = payload.cast("B")
+        if len(payload) == 0 or len(payload) % self.length:
+            raise ValueError("Invalid frame length")
+        if self.bytes_per_led is not None and len(payload) != self.length * self.bytes_per_led:
+            raise ValueError(f"Invalid frame length, expected {self.bytes_per_led} bytes per LED")
+        return payload
+
+    def _allocate(self, bytes_per_led: int) -> None:
+        self._bytes_per_led = bytes_per_led
+        if self.version == 1:
+            header = bytes([0x01]) + self._token_bytes + bytes([self.length])
+            self._header_length = len(header)
+            self._buffers = [bytearray(header + bytes(self.length * bytes_per_led))]
+            return
+        segments = (self.length + RT_PAYLOAD_MAX_LIGHTS - 1) // RT_PAYLOAD_MAX_LIGHTS
+        first = segments if self.version == 2 else 0x03
+        self._buffers = []
+        for i in range(segments):
+            header = bytes([first]) + self._token_bytes + bytes([0, 0]) + bytes([i])
+            lights = min(RT_PAYLOAD_MAX_LIGHTS, self.length - i * RT_PAYLOAD_MAX_LIGHTS)
+            self._header_length = len(header)
+            self._buffers.append(bytearray(header + bytes(lights * bytes_per_led)))
+
+
+class _TwinklyDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self._paused = False
+        self._waiters: list[asyncio.Future] = []
+
+    def pause_writing(self) -> None:
+        _LOGGER.debug("Realtime socket buffer full, pausing")
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        _LOGGER.debug("Realtime socket buffer drained, resuming")
+        self._paused = False
+        self._wake()
+
+    def error_received(self, exc: Exception) -> None:
+        _LOGGER.debug("Realtime socket error: %s", exc)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._paused = False
+        self._wake()
+
+    async def drain(self) -> None:
+        if not self._paused:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await waiter
+
+    def _wake(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class TwinklyDatagramEndpoint:
+    """
+    Non-blocking UDP endpoint for realtime frames.
+
+    The underlying asyncio datagram transport is created on first use and may
+    be shared by several devices, as every datagram carries its own address.
+    Host names are resolved once and cached.
+    """
+
+    def __init__(self):
+        self._transport: asyncio.DatagramTransport | None = None
+        self._protocol: _TwinklyDatagramProtocol | None = None
+        self._lock = asyncio.Lock()
+        self._addresses: dict[tuple[str, int], tuple[str, int]] = {}
+
+    @property
+    def is_open(self) -> bool:
+        return self._transport is not None and not self._transport.is_closing()
+
+    async def open(self) -> None:
+        """Create datagram transport unless already open"""
+        if self.is_open:
+            return
+        async with self._lock:
+            if self.is_open:
+                return
+            loop = asyncio.get_running_loop()
+            self._transport, self._protocol = await loop.create_datagram_endpoint(
+                _TwinklyDatagramProtocol,
+                local_addr=("0.0.0.0", 0),
+                family=socket.AF_INET,
+            )
+
+    async def resolve(self, host: str, port: int) -> tuple[str, int]:
+        """Resolve host and port to a socket address"""
+        address = self._addresses.get((host, port))
+        if address is None:
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            address = infos[0][4]
+            self._addresses[(host, port)] = address
+        return address
+
+    def sendto(self, data: bytes | bytearray | memoryview, address: tuple[str, int]) -> None:
+        """Queue datagram for sending without blocking"""
+        if not self.is_open:
+            raise ConnectionError("Realtime endpoint is not open")
+        self._transport.sendto(data, address)
+
+    async def drain(self) -> None:
+        """Wait until the socket buffer has room for more datagrams"""
+        if self._protocol is not None:
+            await self._protocol.drain()
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+        self._transport = None
+        self._protocol = None
+
+
+class TwinklyRealtimeSession:
+    """
+    Realtime session for a single device.
+
+    The device is interviewed and switched to realtime mode once, after which
+    send() encodes and queues frames synchronously using the pinned LED count
+    and token header. The token is refreshed in the background before it
+    expires, so sending a frame never waits for the network.
+
+        async with t.realtime() as rt:
+            rt.send(frame)
+    """
+
+    def __init__(self, twinkly: "Twinkly", version: int = 1, refresh_margin: float = RT_TOKEN_REFRESH_MARGIN):
+        self._twinkly = twinkly
+        self.version = version
+        self.refresh_margin = refresh_margin
+        self.length = 0
+        self.frames_sent = 0
+        self._encoder: TwinklyFrameEncoder | None = None
+        self._endpoint: TwinklyDatagramEndpoint | None = None
+        self._address: tuple[str, int] | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "TwinklyRealtimeSession":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def start(self) -> None:
+        """Interview device, switch to realtime mode and pin frame parameters"""
+        t = self._twinkly
+        await t.interview()
+        await t.set_mode("rt")
+        self.length = t.length
+        self._encoder = TwinklyFrameEncoder(self.length, self.version, t.bytes_per_led)
+        self._encoder.set_token(await t.ensure_token())
+        self._endpoint = await t._get_endpoint()
+        self._address = await self._endpoint.resolve(t._rt_host, t._rt_port)
+        self._refresh_task = asyncio.create_task(self._refresh_token_loop())
+
+    async def stop(self) -> None:
+        """Stop background token refresh"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+
+    def send(self, frame: TwinklyFrame | Any) -> None:
+        """Encode frame and queue it for sending"""
+        self.send_encoded(self.encode(frame))
+
+    def encode(self, frame: TwinklyFrame | Any) -> list[memoryview]:
+        """Encode frame without sending it"""
+        if self._encoder is None:
+            raise RuntimeError("Realtime session not started")
+        # Follow a token renewed by the client, as the old one is no longer valid
+        if self._twinkly._token is not None:
+            self._encoder.set_token(self._twinkly._token)
+        return self._encoder.encode(frame)
+
+    def send_encoded(self, datagrams: list[memoryview]) -> None:
+        """Queue datagrams returned by encode() for sending"""
+        for datagram in datagrams:
+            self._endpoint.sendto(datagram, self._address)
+        self.frames_sent += 1
+
+    async def drain(self) -> None:
+        """Wait until the socket buffer has room for more frames"""
+        if self._endpoint is not None:
+            await self._endpoint.drain()
+
+    @property
+    def frame_rate(self) -> float:
+        """Frame rate reported by the device"""
+        details = self._twinkly._details
+        return float(details.get("measured_frame_rate") or details.get("frame_rate") or RT_DEFAULT_FRAME_RATE)
+
+    async def play(
+        self,
+        frames: Iterable[TwinklyFrame | Any] | AsyncIterable[TwinklyFrame | Any],
+        fps: float | None = None,
+        count: int | None = None,
+    ) -> "TwinklySchedulerStats":
+        """Send frames paced at fps, defaulting to the device frame rate"""
+        return await TwinklyFrameScheduler(self, fps or self.frame_rate).run(frames, count=count)
+
+    async def _refresh_token_loop(self) -> None:
+        t = self._twinkly
+        while True:
+            # Like login(), the margin is at most half the remaining lifetime,
+            # so a short-lived token is not refreshed back to back
+            remaining = (t._expires or 0) - time.time()
+            delay = remaining - min(self.refresh_margin, remaining / 2)
+            await asyncio.sleep(max(delay, 0))
+            try:
+                await t.refresh_token()
+            except Exception as e:
+                _LOGGER.warning("Failed to refresh realtime token: %s", e)
+                await asyncio.sleep(RT_TOKEN_REFRESH_RETRY)
+                continue
+            self._encoder.set_token(t._token)
+
+
+@dataclass
+class TwinklySchedulerStats:
+    """Statistics from a TwinklyFrameScheduler run"""
+
+    frames_sent: int = 0
+    frames_dropped: int = 0
+    elapsed: float = 0.0
+    jitter: float = 0.0
+    max_lateness: float = 0.0
+
+    @property
+    def fps(self) -> float:
+        """Achieved frames per second"""
+        return self.frames_sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class TwinklyFrameScheduler:
+    """
+    Send frames at a fixed rate using the event loop's monotonic clock.
+
+    Frame slots are scheduled relative to the start of the run, so sleep
+    inaccuracies do not accumulate. When the producer (or the socket) falls
+    more than one slot behind, the missed slots are dropped and the next frame
+    is sent in the current slot instead of queueing up latency. Jitter is the
+    mean deviation of the actual send time from the scheduled slot.
+
+    The session only needs send() and drain() methods, as provided by
+    TwinklyRealtimeSession.
+    """
+
+    def __init__(self, session: Any, fps: float):
+        if fps <= 0:
+            raise ValueError("Invalid frame rate")
+        self.session = session
+        self.fps = fps
+        self.stats = TwinklySchedulerStats()
+
+    async def run(
+        self,
+        frames: Iterable[TwinklyFrame | Any] | AsyncIterable[TwinklyFrame | Any],
+        count: int | None = None,
+    ) -> TwinklySchedulerStats:
+        loop = asyncio.get_running_loop()
+        period = 1 / self.fps
+        stats = self.stats = TwinklySchedulerStats()
+        total_lateness = 0.0
+        start = loop.time()
+        slot = 0
+        async for frame in _aiter(frames):
+            now = loop.time()
+            deadline = start + slot * period
+            if now >= deadline + period:
+                missed = int((now - deadline) // period)
+                stats.frames_dropped += missed
+                slot += missed
+                deadline += missed * period
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+                now = loop.time()
+            self.session.send(frame)
+            await self.session.drain()
+            lateness = max(now - deadline, 0.0)
+            total_lateness += lateness
+            stats.max_lateness = max(stats.max_lateness, lateness)
+            stats.frames_sent += 1
+            slot += 1
+            if count is not None and stats.frames_sent >= count:
+                break
+        stats.elapsed = max(loop.time() - start, slot * period)
+        stats.jitter = total_lateness / stats.frames_sent if stats.frames_sent else 0.0
+        _LOGGER.debug(
+            "Sent %d frames at %.1f fps, %d dropped, jitter %.1f ms",
+            stats.frames_sent,
+            stats.fps,
+            stats.frames_dropped,
+            stats.jitter * 1000,
+        )
+        return stats
+
+
+async def _aiter(frames: Iterable[Any] | AsyncIterable[Any]):
+    if isinstance(frames, AsyncIterable):
+        async for frame in frames:
+            yield frame
+    else:
+        for frame in frames:
+            yield frame
+
+
+class TwinklyPixelMap:
+    """
+    Map pixels of one logical frame onto several devices.
+
+    Devices are laid out back to back in the given order, so global pixel
+    indices 0 to length-1 of the first device map to that device, the next
+    ones to the second device, and so on.
+    """
+
+    def __init__(self, segments: Iterable[tuple[str, int]]):
+        self.segments = list(segments)
+        self._offsets = []
+        offset = 0
+        for _, length in self.segments:
+            self._offsets.append(offset)
+            offset += length
+        self.length = offset
+
+    def locate(self, index: int) -> tuple[str, int]:
+        """Return (device, local index) for a global pixel index"""
+        if not 0 <= index < self.length:
+            raise IndexError("Pixel index out of range")
+        i = bisect.bisect_right(self._offsets, index) - 1
+        return self.segments[i][0], index - self._offsets[i]
+
+    def ranges(self) -> list[tuple[str, int, int]]:
+        """Return (device, start, stop) global pixel ranges"""
+        return [
+            (device, offset, offset + length)
+            for (device, length), offset in zip(self.segments, self._offsets, strict=True)
+        ]
+
+
+@dataclass
+class TwinklyBroadcastStats:
+    """Skew between the first and last datagram of each broadcast frame"""
+
+    frames: int = 0
+    last_skew: float = 0.0
+    max_skew: float = 0.0
+    total_skew: float = 0.0
+
+    @property
+    def mean_skew(self) -> float:
+        return self.total_skew / self.frames if self.frames else 0.0
+
+
+class TwinklyBroadcastSession:
+    """
+    Realtime session spanning several devices that form one display.
+
+    Each frame covers all devices as laid out by a TwinklyPixelMap. The frame
+    is flattened once, every device slice is encoded, and only then are all
+    datagrams sent in one tight burst so that the devices update together.
+    """
+
+    def __init__(self, devices: Iterable["Twinkly"], version: int = 3, refresh_margin: float = RT_TOKEN_REFRESH_MARGIN):
+        self.sessions = [TwinklyRealtimeSession(t, version=version, refresh_margin=refresh_margin) for t in devices]
+        self.pixel_map: TwinklyPixelMap | None = None
+        self.stats = TwinklyBroadcastStats()
+        self.frames_sent = 0
+
+    async def __aenter__(self) -> "TwinklyBroadcastSession":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    @property
+    def length(self) -> int:
+        return self.pixel_map.length if self.pixel_map else 0
+
+    @property
+    def frame_rate(self) -> float:
+        """Lowest frame rate reported by any of the devices"""
+        return min(rt.frame_rate for rt in self.sessions)
+
+    async def start(self) -> None:
+        await asyncio.gather(*(rt.start() for rt in self.sessions))
+        self.pixel_map = TwinklyPixelMap((rt._twinkly.host, rt.length) for rt in self.sessions)
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(rt.stop() for rt in self.sessions))
+
+    def send(self, frame: TwinklyFrame | Any) -> None:
+        """Split frame across devices and send all slices in one burst"""
+        if self.pixel_map is None:
+            raise RuntimeError("Broadcast session not started")
+        if isinstance(frame, list | tuple):
+            if len(frame) != self.length:
+                raise ValueError("Invalid frame length")
+            payload = memoryview(bytes(chain.from_iterable(frame)))
+        else:
+            payload = memoryview(frame).cast("B")
+        if len(payload) == 0 or len(payload) % self.length:
+            raise ValueError("Invalid frame length")
+        bytes_per_led = len(payload) // self.length
+        encoded = [
+            rt.encode(payload[start * bytes_per_led : stop * bytes_per_led])
+            for rt, (_, start, stop) in zip(self.sessions, self.pixel_map.ranges(), strict=True)
+        ]
+        started = time.perf_counter()
+        for rt, datagrams in zip(self.sessions, encoded, strict=True):
+            rt.send_encoded(datagrams)
+        skew = time.perf_counter() - started
+        self.frames_sent += 1
+        self.stats.frames += 1
+        self.stats.last_skew = skew
+        self.stats.max_skew = max(self.stats.max_skew, skew)
+        self.stats.total_skew += skew
+
+    async def drain(self) -> None:
+        endpoints = {id(rt._endpoint): rt for rt in self.sessions}
+        for rt in endpoints.values():
+            await rt.drain()
+
+    async def play(
+        self,
+        frames: Iterable[TwinklyFrame | Any] | AsyncIterable[TwinklyFrame | Any],
+        fps: float | None = None,
+        count: int | None = None,
+    ) -> "TwinklySchedulerStats":
+        """Send frames paced at fps, defaulting to the slowest device frame rate"""
+        return await TwinklyFrameScheduler(self, fps or self.frame_rate).run(frames, count=count)
@@ -0,0 +1,78 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import random
+from dataclasses import dataclass
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_FIRST_TIMEOUT = 3
+DEFAULT_RETRY_BACKOFF = 0.25
+DEFAULT_RETRY_MAX_BACKOFF = 2
+
+# A device that answered less than this many seconds ago is taken to be awake
+DEFAULT_IDLE_AFTER = 10
+
+
+@dataclass(frozen=True)
+class TwinklyRetryPolicy:
+    """
+    Retry policy for transient transport errors.
+
+    When the device has been idle for idle_after seconds or more, and its radio
+    may be asleep, the first attempt uses a short timeout, as one that is
+    waking up is better served by a fresh request than by waiting. A device
+    that answered recently is awake, and as it may legitimately take longer
+    than the short timeout to answer, gets the full one. Later attempts use
+    the full request timeout and are spaced by exponential backoff with jitter.
+    """
+
+    attempts: int = DEFAULT_RETRY_ATTEMPTS
+    first_timeout: float | None = DEFAULT_FIRST_TIMEOUT
+    backoff: float = DEFAULT_RETRY_BACKOFF
+    max_backoff: float = DEFAULT_RETRY_MAX_BACKOFF
+    jitter: float = 0.5
+    idle_after: float = DEFAULT_IDLE_AFTER
+
+    def timeout(self, attempt: int, timeout: float, idle: float | None = None) -> float:
+        """
+        Return timeout for attempt (counted from 0) given the full request timeout
+        and the seconds since the device last answered, None if it never did
+        """
+        if attempt > 0 or self.attempts == 1 or self.first_timeout is None:
+            return timeout
+        if idle is not None and idle < self.idle_after:
+            return timeout
+        return min(self.first_timeout, timeout)
+
+    def delay(self, attempt: int) -> float:
+        """Return delay before retry attempt (counted from 1)"""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+NO_RETRY = TwinklyRetryPolicy(attempts=1)
@@ -0,0 +1,91 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from dataclasses import dataclass, field
+
+from .colours import TwinklyColour
+from .state import TwinklyState
+
+
+@dataclass
+class TwinklyScene:
+    """
+    Declarative device state, applied with Twinkly.apply_scene().
+
+    Fields left as None are not changed. Unless given, the mode follows from
+    the other fields: "color" for a colour and "movie" for a movie.
+    """
+
+    mode: str | None = None
+    brightness: int | None = None
+    colour: TwinklyColour | None = None
+    movie_id: int | None = None
+
+    @property
+    def target_mode(self) -> str | None:
+        if self.mode is not None:
+            return self.mode
+        if self.colour is not None:
+            return "color"
+        if self.movie_id is not None:
+            return "movie"
+        return None
+
+    @property
+    def fields(self) -> list[str]:
+        """Fields set by the scene, in the order they are written"""
+        fields = []
+        if self.colour is not None:
+            fields.append("colour")
+        if self.movie_id is not None:
+            fields.append("movie")
+        if self.brightness is not None:
+            fields.append("brightness")
+        if self.target_mode is not None:
+            fields.append("mode")
+        return fields
+
+    def changes(self, state: TwinklyState) -> list[str]:
+        """Return fields set by the scene that differ from state"""
+        current = {
+            "colour": state.colour == self.colour,
+            "movie": (state.movie or {}).get("id") == self.movie_id,
+            "brightness": state.brightness == self.brightness and bool(state.brightness_enabled),
+            "mode": state.mode == self.target_mode,
+        }
+        return [f for f in self.fields if not current[f]]
+
+
+@dataclass
+class TwinklySceneResult:
+    """Outcome of applying a scene to a device"""
+
+    written: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    requests: int = 0
+    latency: float = 0.0
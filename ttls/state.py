@@ -0,0 +1,110 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from .colours import TwinklyColour
+
+# Seconds a cached value is considered fresh, unless overridden per field
+DEFAULT_STATE_TTL = 5.0
+
+
+class TwinklyStateCache:
+    """
+    Read-through cache of device state with per-field time to live.
+
+    Fields are updated with the response of every successful read and with
+    the written value after every successful write, so that reads right after
+    a write do not need the network. Hits and misses are counted per field.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_STATE_TTL, ttls: dict[str, float] | None = None):
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._values: dict[str, tuple[float, Any]] = {}
+
+    def get(self, field: str) -> Any | None:
+        """Return fresh value of field, or None"""
+        entry = self._values.get(field)
+        if entry is not None and time.monotonic() - entry[0] < self.ttls.get(field, self.ttl):
+            self.hits[field] += 1
+            return entry[1]
+        self.misses[field] += 1
+        return None
+
+    def set(self, field: str, value: Any) -> None:
+        self._values[field] = (time.monotonic(), value)
+
+    def invalidate(self, field: str | None = None) -> None:
+        """Forget field, or all fields"""
+        if field is None:
+            self._values.clear()
+        else:
+            self._values.pop(field, None)
+
+
+@dataclass
+class TwinklyState:
+    """Snapshot of device state, as returned by Twinkly.refresh_state()"""
+
+    mode: str | None = None
+    brightness: int | None = None
+    brightness_enabled: bool | None = None
+    colour: TwinklyColour | None = None
+    movie: dict[str, Any] | None = None
+    network: dict[str, Any] | None = None
+
+    @property
+    def is_on(self) -> bool | None:
+        return None if self.mode is None else self.mode != "off"
+
+    @classmethod
+    def from_summary(cls, summary: dict[str, Any]) -> "TwinklyState":
+        """Parse the fields present in a summary response"""
+        state = cls()
+        led_mode = summary.get("led_mode")
+        if isinstance(led_mode, dict):
+            state.mode = led_mode.get("mode")
+            if "id" in led_mode or "unique_id" in led_mode:
+                state.movie = {k: led_mode[k] for k in ("id", "unique_id", "name") if k in led_mode}
+        for f in summary.get("filters") or []:
+            if f.get("filter") == "brightness" and isinstance(f.get("config"), dict):
+                state.brightness = f["config"].get("value")
+                state.brightness_enabled = f["config"].get("mode") == "enabled"
+        colour = summary.get("color")
+        if isinstance(colour, dict) and {"red", "green", "blue"} <= colour.keys():
+            state.colour = TwinklyColour.from_dict(colour)
+        network = summary.get("network")
+        if isinstance(network, dict):
+            state.network = network
+        return state
@@ -0,0 +1,136 @@
+"""
+Twinkly Twinkly Little Star
+https://github.com/jschlyter/ttls
+
+Copyright (c) 2019 Jakob Schlyter. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright
+   notice, this list of conditions and the following disclaimer in the
+   documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+ARE DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE
+GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from .limiter import PRIORITY_LOW
+
+if TYPE_CHECKING:
+    from .client import Twinkly
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WARM_INTERVAL = 20
+DEFAULT_WARM_MIN_INTERVAL = 2
+DEFAULT_WARM_MAX_INTERVAL = 120
+
+# A ping slower than this many times the fastest ping seen is taken to have
+# woken the radio
+DEFAULT_WARM_SLOW_FACTOR = 4
+
+# Growth and shrink factors of the ping interval. After a slow ping, the
+# interval never grows beyond WARM_INTERVAL_HEADROOM of the one that let the
+# radio sleep.
+WARM_INTERVAL_GROWTH = 1.25
+WARM_INTERVAL_SHRINK = 0.5
+WARM_INTERVAL_HEADROOM = 0.8
+
+
+class TwinklyWarmer:
+    """
+    Keep the radio of a device awake with cheap requests while it is idle.
+
+    A ping to /xled/info is sent whenever no other request has been made for
+    interval seconds. The interval adapts to the device: a ping answered about
+    as fast as the fastest one seen means the radio was still awake, and the
+    interval grows. A ping much slower than that means the radio had gone to
+    sleep, and the interval shrinks and is kept below the one that let it.
+    """
+
+    def __init__(
+        self,
+        twinkly: "Twinkly",
+        interval: float = DEFAULT_WARM_INTERVAL,
+        min_interval: float = DEFAULT_WARM_MIN_INTERVAL,
+        max_interval: float = DEFAULT_WARM_MAX_INTERVAL,
+        slow_factor: float = DEFAULT_WARM_SLOW_FACTOR,
+    ):
+        self.twinkly = twinkly
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slow_factor = slow_factor
+        self.warm_latency: float | None = None
+        self.cold_latency: float | None = None
+        self.pings = 0
+        self.slow_pings = 0
+        self._ceiling = max_interval
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def warm(self) -> float:
+        """Ping the device once, adapting the interval, and return the latency"""
+        start = time.monotonic()
+        await self.twinkly._info(priority=PRIORITY_LOW)
+        latency = time.monotonic() - start
+        self._adapt(latency)
+        return latency
+
+    def _adapt(self, latency: float) -> None:
+        self.pings += 1
+        if self.warm_latency is not None and latency > self.warm_latency * self.slow_factor:
+            self.slow_pings += 1
+            self.cold_latency = latency
+            self._ceiling = max(self.min_interval, self.interval * WARM_INTERVAL_HEADROOM)
+            self.interval = max(self.min_interval, self.interval * WARM_INTERVAL_SHRINK)
+            _LOGGER.debug("Slow ping to %s (%.3fs), interval now %.1fs", self.twinkly.host, latency, self.interval)
+        else:
+            self.interval = min(self._ceiling, self.interval * WARM_INTERVAL_GROWTH)
+        if self.warm_latency is None or latency < self.warm_latency:
+            self.warm_latency = latency
+
+    async def _run(self) -> None:
+        while True:
+            last = self.twinkly._last_request
+            idle = time.monotonic() - last if last is not None else self.interval
+            if idle < self.interval:
+                await asyncio.sleep(self.interval - idle)
+                continue
+            try:
+                await self.warm()
+            except Exception as e:
+                _LOGGER.debug("Keep-warm ping to %s failed: %s", self.twinkly.host, e)
+                await asyncio.sleep(self.interval)